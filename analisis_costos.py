@@ -0,0 +1,161 @@
+import math
+from dataclasses import dataclass
+from itertools import combinations
+import numpy as np
+from calculo_boater import calcular_costo, distancia_minima
+from tarifas_boater import obtener_tablas
+
+# Para una configuración fija, calcular_costo es lineal a tramos en la distancia:
+#   costo(d) = costo_por_km * max(d, distancia_minima) + tarifa_espera(d) * tiempo_espera
+# costo_por_km no depende de d (los factores HP y asientos dependen de hp y asientos),
+# el mínimo de 15 km / 12 km agrega un quiebre y la columna de espera más cercana a d
+# cambia en los puntos medios entre columnas. Cada tramo es (desde, hasta] con su recta.
+
+
+@dataclass
+class Tramo:
+    desde: float
+    hasta: float
+    pendiente: float
+    ordenada: float
+
+    def costo(self, distancia):
+        return self.pendiente * distancia + self.ordenada
+
+
+# Puntos medios entre columnas consecutivas: ahí cambia la columna más cercana.
+# En un punto medio exacto gana la columna menor, como en indice_mas_cercano.
+def puntos_de_quiebre(columnas):
+    columnas = np.asarray(columnas, dtype=float)
+    return (columnas[:-1] + columnas[1:]) / 2
+
+
+class ModeloCosto:
+    # Estructura lineal a tramos del costo de una configuración. `config` usa las mismas
+    # claves que las curvas de las interfaces: tipo_motor, hp, vel, asientos, precio, espera.
+    def __init__(self, config, tablas=None):
+        self.config = config
+        tablas = tablas or obtener_tablas()
+        self.tipo_motor = config["tipo_motor"]
+        self.espera = float(config.get("espera") or 0.0)
+        self.costo_por_km = calcular_costo(self.tipo_motor, config["hp"], config["vel"], config["asientos"],
+                                           0, config["precio"], tablas=tablas)[0]
+        self.distancia_minima = distancia_minima(self.tipo_motor)
+
+        quiebres = {self.distancia_minima}
+        if self.espera > 0 and len(tablas.columnas_espera):
+            quiebres.update(puntos_de_quiebre(tablas.columnas_espera).tolist())
+        self.quiebres = sorted(q for q in quiebres if q > 0)
+
+        limites = [0.0] + self.quiebres + [math.inf]
+        self.tramos = []
+        for desde, hasta in zip(limites[:-1], limites[1:]):
+            punto = desde + 0.5 * (hasta - desde) if math.isfinite(hasta) else desde + 1.0
+            tarifa = tablas.tarifa_espera(punto) if self.espera > 0 else None
+            extra = tarifa * self.espera if tarifa is not None else 0.0
+            if hasta <= self.distancia_minima:
+                self.tramos.append(Tramo(desde, hasta, 0.0, self.costo_por_km * self.distancia_minima + extra))
+            else:
+                self.tramos.append(Tramo(desde, hasta, self.costo_por_km, extra))
+
+    def tramo(self, distancia):
+        for tramo in self.tramos:
+            if distancia <= tramo.hasta:
+                return tramo
+        return self.tramos[-1]
+
+    def costo(self, distancias):
+        distancias = np.asarray(distancias, dtype=float)
+        limites = np.array([t.hasta for t in self.tramos])
+        indices = np.minimum(np.searchsorted(limites, distancias, side="left"), len(self.tramos) - 1)
+        pendientes = np.array([t.pendiente for t in self.tramos])[indices]
+        ordenadas = np.array([t.ordenada for t in self.tramos])[indices]
+        return pendientes * distancias + ordenadas
+
+    # Derivada del costo total respecto del precio del combustible (€ por cada €/litro)
+    # y elasticidad (% de cambio del costo por 1% de cambio del precio)
+    def sensibilidad_precio(self, distancia):
+        derivada = self.costo_por_km / self.config["precio"] * max(distancia, self.distancia_minima)
+        total = float(self.costo(distancia))
+        return {"derivada": derivada, "elasticidad": derivada * self.config["precio"] / total if total else 0.0}
+
+
+# Distancias en las que cambia cuál de las dos configuraciones es más barata. Devuelve
+# una lista de dicts {"distancia", "mas_barata"} con la más barata ("a" o "b") a partir de ese punto.
+def cruces(config_a, config_b, tablas=None):
+    a = config_a if isinstance(config_a, ModeloCosto) else ModeloCosto(config_a, tablas)
+    b = config_b if isinstance(config_b, ModeloCosto) else ModeloCosto(config_b, tablas)
+    limites = [0.0] + sorted(set(a.quiebres) | set(b.quiebres)) + [math.inf]
+
+    resultado = []
+    signo_anterior = 0
+    for desde, hasta in zip(limites[:-1], limites[1:]):
+        punto = hasta if math.isfinite(hasta) else desde + 1.0
+        ta, tb = a.tramo(punto), b.tramo(punto)
+        pendiente = ta.pendiente - tb.pendiente
+        ordenada = ta.ordenada - tb.ordenada
+        # Signo de la diferencia a - b al empezar y al terminar el tramo
+        inicio = pendiente * desde + ordenada
+        fin = pendiente * hasta + ordenada if math.isfinite(hasta) else (pendiente if pendiente else ordenada)
+        for valor, en_tramo in ((inicio, False), (fin, True)):
+            signo = _signo(valor)
+            if signo == 0:
+                continue
+            if signo_anterior and signo != signo_anterior:
+                # Dentro del tramo el cruce está en la raíz de la recta; si no, es un salto en `desde`
+                distancia = -ordenada / pendiente if en_tramo and pendiente else desde
+                resultado.append({"distancia": distancia, "mas_barata": "a" if signo < 0 else "b"})
+            signo_anterior = signo
+    return resultado
+
+
+def _signo(valor, tolerancia=1e-9):
+    return 0 if abs(valor) <= tolerancia else (1 if valor > 0 else -1)
+
+
+# Primera distancia a partir de la cual `config_a` pasa a ser más barata que `config_b`:
+# 0.0 si ya lo es desde el primer tramo, None si nunca ocurre
+def distancia_equilibrio(config_a, config_b, tablas=None):
+    a = config_a if isinstance(config_a, ModeloCosto) else ModeloCosto(config_a, tablas)
+    b = config_b if isinstance(config_b, ModeloCosto) else ModeloCosto(config_b, tablas)
+    # Signo de a - b al empezar el primer tramo (o, si ahí son iguales, hacia dónde se separan)
+    primer_limite = min(a.quiebres + b.quiebres, default=1.0)
+    ta, tb = a.tramo(primer_limite), b.tramo(primer_limite)
+    if (_signo(ta.ordenada - tb.ordenada) or _signo(ta.pendiente - tb.pendiente)) < 0:
+        return 0.0
+    for cruce in cruces(a, b):
+        if cruce["mas_barata"] == "a":
+            return cruce["distancia"]
+    return None
+
+
+# Cruces entre todas las curvas, para mostrar en las interfaces
+def cruces_entre_curvas(curvas, tablas=None):
+    modelos = [ModeloCosto(curva, tablas) for curva in curvas]
+    resultado = []
+    for (i, a), (j, b) in combinations(enumerate(modelos), 2):
+        for cruce in cruces(a, b):
+            ganadora = curvas[i] if cruce["mas_barata"] == "a" else curvas[j]
+            resultado.append({
+                "curva_a": curvas[i].get("nombre", f"Curva {i + 1}"),
+                "curva_b": curvas[j].get("nombre", f"Curva {j + 1}"),
+                "distancia": cruce["distancia"],
+                "mas_barata": ganadora.get("nombre", ""),
+            })
+    return sorted(resultado, key=lambda c: c["distancia"])
+
+
+# Factor sobre los precios de combustible de ambas configuraciones para el que las dos
+# cuestan lo mismo a la distancia dada (1.0 = precios actuales). None si no existe.
+def factor_precio_equilibrio(config_a, config_b, distancia, tablas=None):
+    a = config_a if isinstance(config_a, ModeloCosto) else ModeloCosto(config_a, tablas)
+    b = config_b if isinstance(config_b, ModeloCosto) else ModeloCosto(config_b, tablas)
+    # costo = combustible * factor + espera
+    combustible_a = a.costo_por_km * max(distancia, a.distancia_minima)
+    combustible_b = b.costo_por_km * max(distancia, b.distancia_minima)
+    espera_a = float(a.costo(distancia)) - combustible_a
+    espera_b = float(b.costo(distancia)) - combustible_b
+    if math.isclose(combustible_a, combustible_b):
+        return None
+    factor = (espera_b - espera_a) / (combustible_a - combustible_b)
+    return factor if factor > 0 else None
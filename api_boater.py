@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from metricas_boater import registro
+from calculo_boater import COEFICIENTES_MOTOR, calcular_costo, calcular_costos_batch
+from historial_precios import producto_para_motor
+from matriz_precios import REGION_POR_DEFECTO, obtener_matriz
+from precios_combustible import obtener_proveedor
+from tarifas_boater import obtener_tablas
+
+# Lotes con menos filas se calculan en el mismo proceso
+UMBRAL_LOTE_POOL = 5_000
+# Con BOATER_PERFIL=1 todas las respuestas incluyen los tramos y el perfil cProfile de la petición;
+# si no, se piden por petición con el encabezado "x-boater-perfil: 1"
+PERFIL_SIEMPRE = os.environ.get("BOATER_PERFIL", "") not in ("", "0")
+MAX_CUERPO = 50 * 1024 * 1024
+
+
+class ErrorPeticion(Exception):
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+# Valida los campos numéricos de uno o varios viajes (escalares o arrays, sin NaN ni infinitos):
+# vel_crucero > 0 y el resto >= 0. Para un lote el error indica el primer viaje inválido.
+def _validar_viajes(valores, lote=False):
+    for campo, valor in valores.items():
+        valor = np.atleast_1d(np.asarray(valor, dtype=float))
+        if campo == "vel_crucero":
+            invalidos, condicion = ~(valor > 0), "un número finito mayor que 0"
+        else:
+            invalidos, condicion = ~(valor >= 0), "un número finito no negativo"
+        invalidos |= ~np.isfinite(valor)
+        if invalidos.any():
+            viaje = f" (viaje {int(np.flatnonzero(invalidos)[0])})" if lote else ""
+            raise ErrorPeticion(f"{campo} debe ser {condicion}{viaje}")
+
+
+def _cotizar_lote(tipo_motor, hp, vel_crucero, asientos, distancia, precio_combustible, tiempo_espera):
+    # Se ejecuta en los procesos del pool: devuelve listas para no serializar arrays
+    costo_por_km, costo_total = calcular_costos_batch(tipo_motor, hp, vel_crucero, asientos, distancia,
+                                                      precio_combustible, tiempo_espera)
+    return costo_por_km.tolist(), costo_total.tolist()
+
+
+class AppCotizaciones:
+    # Aplicación ASGI sin dependencias: POST /cotizar, POST /cotizar/lote, GET /salud y GET /metricas.
+    # Las tarifas y los precios se cargan al arrancar; los lotes grandes van a un pool de procesos.
+    def __init__(self, procesos=None, umbral_pool=UMBRAL_LOTE_POOL):
+        self.procesos = procesos if procesos is not None else os.cpu_count() or 1
+        self.umbral_pool = umbral_pool
+        self.pool = None
+        self.precios = None
+        self._version = (None, None)  # (clave, dict de version()); ver version()
+
+    # Arranque y cierre (también se llaman desde el protocolo lifespan de ASGI)
+    def iniciar(self):
+        obtener_tablas()
+        self.precios = obtener_proveedor().obtener()
+        obtener_matriz()
+        if self.procesos > 1 and self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.procesos, initializer=obtener_tablas)
+
+    def cerrar(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def _precios_actuales(self):
+        # Nunca espera a la red: si hay una descarga en curso se siguen usando los precios cargados
+        futuro = obtener_proveedor().obtener_en_segundo_plano()
+        if futuro.done():
+            self.precios = futuro.result()
+        return self.precios
+
+    def version(self):
+        tablas = obtener_tablas()
+        precios = self._precios_actuales()
+        huella = obtener_matriz(bloquear=False).huella
+        # Se llama en cada respuesta: el hash solo se recalcula si cambian las tarifas, los precios o la
+        # matriz. Los valores por defecto se crean en cada consulta con otro timestamp pero son fijos.
+        obtenido = None if precios.origen == "defecto" else precios.obtenido
+        clave = (tablas.mtime, obtenido, precios.origen, huella)
+        if self._version[0] == clave:
+            return self._version[1]
+        # La ETag depende solo de los datos usados para cotizar: tarifas y precios
+        datos = (f"{tablas.mtime}:{precios.benzina}:{precios.gasolio}:{sorted((precios.regiones or {}).items())}"
+                 f":{huella}")
+        version = {
+            "tarifas": str(tablas.mtime),
+            "precios": precios.obtenido,
+            "origen_precios": precios.origen,
+            "etag": '"' + hashlib.sha1(datos.encode()).hexdigest()[:16] + '"',
+        }
+        self._version = (clave, version)
+        return version
+
+    # Precio por región (Lombardia si no se indica) y combustible (según el motor si no se indica),
+    # del último ciclo de la matriz de precios; nunca espera a la red si ya hay una matriz cargada
+    def _precio_para(self, tipo_motor, region=None, combustible=None):
+        try:
+            return obtener_matriz(bloquear=False).precio(region or REGION_POR_DEFECTO,
+                                                         combustible or producto_para_motor(tipo_motor))
+        except KeyError as e:
+            raise ErrorPeticion(str(e.args[0])) from None
+
+    def cotizar(self, viaje):
+        try:
+            tipo_motor = str(viaje["tipo_motor"]).strip().lower()
+            precio = viaje.get("precio_combustible")
+            if precio is None:
+                precio = self._precio_para(tipo_motor, viaje.get("region"), viaje.get("combustible"))
+            valores = {c: float(viaje[c]) for c in ("hp", "vel_crucero", "asientos", "distancia")}
+            valores["precio_combustible"] = float(precio)
+            tiempo_espera = viaje.get("tiempo_espera")
+            if tiempo_espera is not None:
+                valores["tiempo_espera"] = tiempo_espera = float(tiempo_espera)
+            _validar_viajes(valores)
+            costo_por_km, costo_total = calcular_costo(
+                tipo_motor, valores["hp"], valores["vel_crucero"], valores["asientos"],
+                valores["distancia"], valores["precio_combustible"], tiempo_espera)
+        except KeyError as e:
+            raise ErrorPeticion(f"Falta el campo {e}") from None
+        except (TypeError, ValueError) as e:
+            raise ErrorPeticion(str(e)) from None
+        return {"costo_por_km": costo_por_km, "costo_total": costo_total, "precio_combustible": float(precio)}
+
+    async def cotizar_lote(self, viajes):
+        if not isinstance(viajes, list) or not viajes:
+            raise ErrorPeticion("Se espera una lista 'viajes' no vacía")
+        try:
+            tipo_motor = np.array([str(v["tipo_motor"]).strip().lower() for v in viajes])
+            columnas = {c: np.array([v[c] for v in viajes], dtype=float)
+                        for c in ("hp", "vel_crucero", "asientos", "distancia")}
+            regiones = np.array([v.get("region") or REGION_POR_DEFECTO for v in viajes])
+            combustibles = np.array([v.get("combustible") or producto_para_motor(m) for v, m in zip(viajes, tipo_motor)])
+            precios = np.array([v.get("precio_combustible") for v in viajes], dtype=float)
+            espera = np.array([v.get("tiempo_espera") or 0.0 for v in viajes], dtype=float)
+        except KeyError as e:
+            raise ErrorPeticion(f"Falta el campo {e}") from None
+        except (TypeError, ValueError) as e:
+            raise ErrorPeticion(str(e)) from None
+        if any(m not in COEFICIENTES_MOTOR for m in np.unique(tipo_motor)):
+            raise ErrorPeticion("Tipo de motor no reconocido.")
+        _validar_viajes({**columnas, "tiempo_espera": espera}, lote=True)
+
+        # Los viajes sin precio propio toman el de su región y combustible, todos del mismo
+        # ciclo de la matriz de precios
+        sin_precio = np.isnan(precios)
+        if sin_precio.any():
+            try:
+                precios[sin_precio] = obtener_matriz(bloquear=False).precios_lote(regiones[sin_precio],
+                                                                                 combustibles[sin_precio])
+            except KeyError as e:
+                raise ErrorPeticion(str(e.args[0])) from None
+            if np.isnan(precios).any():
+                fila = int(np.flatnonzero(np.isnan(precios))[0])
+                raise ErrorPeticion(f"Sin precio de {combustibles[fila]} en {regiones[fila]}")
+        _validar_viajes({"precio_combustible": precios}, lote=True)
+
+        argumentos = (tipo_motor, columnas["hp"], columnas["vel_crucero"], columnas["asientos"],
+                      columnas["distancia"], precios, espera)
+        if self.pool is not None and len(viajes) >= self.umbral_pool:
+            loop = asyncio.get_running_loop()
+            costo_por_km, costo_total = await loop.run_in_executor(self.pool, _cotizar_lote, *argumentos)
+        else:
+            costo_por_km, costo_total = _cotizar_lote(*argumentos)
+        return {"costo_por_km": costo_por_km, "costo_total": costo_total, "precio_combustible": precios.tolist()}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        metodo, ruta = scope["method"], scope["path"].rstrip("/") or "/"
+        if ruta == "/metricas" and metodo == "GET":
+            await self._responder_texto(send, 200, registro.texto_prometheus())
+            return
+
+        perfilar = PERFIL_SIEMPRE or dict(scope.get("headers") or []).get(b"x-boater-perfil") == b"1"
+        with registro.capturar(perfilar) as captura:
+            try:
+                with registro.tramo("api", ruta=ruta):
+                    if self.precios is None:
+                        self.iniciar()
+                    if ruta == "/salud" and metodo == "GET":
+                        respuesta = {"estado": "ok", "version": self.version()}
+                    elif ruta == "/cotizar" and metodo == "POST":
+                        respuesta = self.cotizar(await self._leer_json(receive))
+                    elif ruta == "/cotizar/lote" and metodo == "POST":
+                        respuesta = await self.cotizar_lote((await self._leer_json(receive)).get("viajes"))
+                    else:
+                        raise ErrorPeticion("No encontrado", 404)
+                estado = 200
+            except ErrorPeticion as e:
+                registro.contar("api_errores", estado=e.estado)
+                estado, respuesta = e.estado, {"error": str(e)}
+            except Exception as e:
+                # Cualquier otro error también responde con JSON, sin cortar la conexión
+                registro.contar("api_errores", estado=500)
+                estado, respuesta = 500, {"error": f"Error interno: {type(e).__name__}"}
+        if perfilar:
+            respuesta["depuracion"] = {"tramos": captura.tramos, "perfil": captura.resumen_perfil()}
+        await self._responder(send, estado, respuesta)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                await asyncio.get_running_loop().run_in_executor(None, self.iniciar)
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                self.cerrar()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _leer_json(self, receive):
+        cuerpo = bytearray()
+        while True:
+            mensaje = await receive()
+            cuerpo += mensaje.get("body", b"")
+            if len(cuerpo) > MAX_CUERPO:
+                raise ErrorPeticion("Cuerpo demasiado grande", 413)
+            if not mensaje.get("more_body"):
+                break
+        try:
+            datos = json.loads(cuerpo or b"{}")
+        except ValueError:
+            raise ErrorPeticion("JSON inválido") from None
+        if not isinstance(datos, dict):
+            raise ErrorPeticion("Se espera un objeto JSON")
+        return datos
+
+    async def _responder_texto(self, send, estado, texto):
+        cuerpo = texto.encode("utf-8")
+        headers = [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                   (b"content-length", str(len(cuerpo)).encode())]
+        await send({"type": "http.response.start", "status": estado, "headers": headers})
+        await send({"type": "http.response.body", "body": cuerpo})
+
+    async def _responder(self, send, estado, datos):
+        cuerpo = json.dumps(datos).encode("utf-8")
+        version = self.version() if self.precios is not None else None
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(cuerpo)).encode())]
+        if version is not None:
+            headers += [(b"etag", version["etag"].encode()),
+                        (b"x-version-tarifas", version["tarifas"].encode())]
+        await send({"type": "http.response.start", "status": estado, "headers": headers})
+        await send({"type": "http.response.body", "body": cuerpo})
+
+
+app = AppCotizaciones()
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("api_boater:app", host=os.environ.get("BOATER_HOST", "127.0.0.1"),
+                port=int(os.environ.get("BOATER_PUERTO", "8000")))
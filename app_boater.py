@@ -1,10 +1,15 @@
 
 import streamlit as st
-from calculo_boater import calcular_costo, obtener_precios_lombardia
+from calculo_boater import obtener_precios_lombardia
+from precios_combustible import obtener_proveedor
+from cache_cotizaciones import calcular_costo_cacheado
 
 st.set_page_config(page_title="Boater - Calculadora de Costos", layout="centered")
 st.title("⚓ Calculadora de Costos de Viaje - Boater")
 
+# Descarga de precios en segundo plano mientras se dibuja el formulario
+obtener_proveedor().obtener_en_segundo_plano()
+
 st.markdown("Calcula el costo estimado de un viaje en barco en función de los parámetros técnicos.")
 
 tipo_motor = st.selectbox("Tipo de motor", [
@@ -23,7 +28,7 @@ if st.button("Calcular costo"):
         precio_benzina, precio_gasolio = obtener_precios_lombardia()
         precio = precio_gasolio if "diesel" in tipo_motor else precio_benzina
 
-        costo_km, costo_total = calcular_costo(tipo_motor, hp, velocidad, asientos, distancia, precio)
+        costo_km, costo_total = calcular_costo_cacheado(tipo_motor, hp, velocidad, asientos, distancia, precio)
 
         st.success(f"Precio de combustible usado: €{precio:.3f}/litro")
         st.info(f"Costo por kilómetro: €{costo_km:.2f}")
@@ -1,13 +1,26 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import csv
-from io import BytesIO, StringIO
-from calculo_boater import calcular_costo, obtener_precios_lombardia
+import uuid
+from io import StringIO
+import numpy as np
+from calculo_boater import calcular_costos_batch, obtener_precios_lombardia
+from precios_combustible import obtener_proveedor
+from cache_cotizaciones import cache_cotizaciones, calcular_costo_cacheado
+from metricas_boater import registro
+from historial_precios import cargar_historial, precios_historicos
+from render_curvas import grilla_distancias, renderizar
+from analisis_costos import cruces_entre_curvas
+from tarifas_boater import obtener_tablas
 
 st.set_page_config(page_title="Boater - Calculadora de Costos", layout="centered")
 st.title("⚓ Calculadora de Costos de Viaje - Boater")
 
+# Descarga de precios en segundo plano mientras se dibuja el formulario
+obtener_proveedor().obtener_en_segundo_plano()
+
+panel_depuracion = st.sidebar.expander("🔧 Depuración")
+perfilar = panel_depuracion.checkbox("Perfilar el cálculo individual (cProfile)")
+
 tab1, tab2 = st.tabs(["🚤 Viaje individual", "📈 Comparar curvas de costo"])
 
 # VIAJE INDIVIDUAL
@@ -24,28 +37,123 @@ with tab1:
     asientos = st.number_input("Cantidad de asientos", min_value=1, max_value=30, value=6)
     distancia = st.number_input("Distancia del viaje (km)", min_value=1, value=10, step=1, format="%d")
     tiempo_espera = st.number_input("Tiempo de espera (horas)", min_value=0, value=0, step=1, format="%d")
+    usar_historico = st.checkbox("Usar precio histórico (media nacional MIMIT)")
+    if usar_historico:
+        historial = cargar_historial()
+        anio_hist = st.number_input("Año", min_value=historial.anio_inicial, max_value=historial.anio_final,
+                                    value=historial.anio_final, step=1, format="%d")
+        mes_hist = st.number_input("Mes", min_value=1, max_value=12, value=1, step=1, format="%d")
 
     if st.button("Calcular costo individual"):
         try:
-            precio_benzina, precio_gasolio = obtener_precios_lombardia()
-            precio = precio_gasolio if "diesel" in tipo_motor else precio_benzina
-            costo_km, costo_total = calcular_costo(tipo_motor, hp, velocidad, asientos, distancia, precio, tiempo_espera)
+            with registro.capturar(perfilar) as captura:
+                if usar_historico:
+                    precio_benzina, precio_gasolio = precios_historicos(int(anio_hist), int(mes_hist))
+                else:
+                    precio_benzina, precio_gasolio = obtener_precios_lombardia()
+                precio = precio_gasolio if "diesel" in tipo_motor else precio_benzina
+                costo_km, costo_total = calcular_costo_cacheado(tipo_motor, hp, velocidad, asientos, distancia, precio, tiempo_espera)
 
             st.success(f"Precio de combustible usado: €{precio:.3f}/litro")
             st.info(f"Costo por kilómetro: €{costo_km:.2f}")
             st.success(f"✅ Costo total estimado para {distancia:.1f} km: €{costo_total:.2f}")
+            if perfilar:
+                with st.expander("Tramos y perfil de este cálculo"):
+                    st.table([{"tramo": nombre, "ms": f"{segundos * 1e3:.3f}"} for nombre, segundos in captura.tramos])
+                    if captura.perfil is not None:
+                        st.code(captura.resumen_perfil())
         except Exception as e:
             st.error(f"Ocurrió un error: {e}")
 
 # CURVAS DE COSTO
+# Cada curva guarda sus costos (un array sobre la grilla de distancias) al agregarla: agregar o
+# quitar una curva no recalcula las demás. La imagen, el CSV y los cruces se derivan de esos
+# arrays con st.cache_data, con la grilla y los ids de las curvas como clave.
+
+def clave_grilla(paso, maximo):
+    # Incluye la versión de las tablas: si cambia el Excel se recalculan las curvas
+    return paso, maximo, obtener_tablas().mtime
+
+
+def calcular_costos_curvas(curvas, distancias):
+    # Todas las curvas en una sola llamada: filas = curvas, columnas = distancias
+    columna = lambda campo: np.array([curva[campo] for curva in curvas])[:, None]
+    return calcular_costos_batch(columna("tipo_motor"), columna("hp"), columna("vel"), columna("asientos"),
+                                 distancias[None, :], columna("precio"), columna("espera"))[1]
+
+
+def sincronizar_grilla(paso, maximo):
+    clave = clave_grilla(paso, maximo)
+    if st.session_state.clave_grilla != clave:
+        st.session_state.clave_grilla = clave
+        st.session_state.distancias = grilla_distancias(paso, maximo)
+        if st.session_state.curvas:
+            costos = calcular_costos_curvas(st.session_state.curvas, st.session_state.distancias)
+            for curva, fila in zip(st.session_state.curvas, costos):
+                curva["costos"] = fila
+
+
+def agregar_curva(curva):
+    curva["id"] = st.session_state.siguiente_id
+    st.session_state.siguiente_id += 1
+    curva["costos"] = calcular_costos_curvas([curva], st.session_state.distancias)[0]
+    st.session_state.curvas.append(curva)
+
+
+def quitar_curvas():
+    quitar = set(st.session_state.curvas_a_quitar)
+    st.session_state.curvas = [c for c in st.session_state.curvas if c["id"] not in quitar]
+    st.session_state.curvas_a_quitar = []
+
+
+def limpiar_curvas():
+    st.session_state.curvas = []
+    st.session_state.curvas_a_quitar = []
+
+
+# Los argumentos con "_" no se hashean: la clave es (grilla, ids), y el id de una curva no se
+# reutiliza en la sesión. La sesión va en la clave porque los ids son por sesión.
+@st.cache_data(max_entries=32, show_spinner=False)
+def imagen_curvas(sesion, grilla, ids, _curvas, _distancias):
+    return renderizar(_curvas, _distancias)
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def csv_curvas(sesion, grilla, ids, _curvas, _distancias):
+    texto = StringIO()
+    writer = csv.writer(texto)
+    writer.writerow(["Curva", "Distancia (km)", "Costo (€)", "", "Curva", "Distancia (km)", "Costo por asiento (€)"])
+    for curva in _curvas:
+        nombre = curva["nombre"]
+        writer.writerows(
+            [nombre, f"{d:g}", f"{c:.2f}", "", nombre, f"{d:g}", f"{p:.2f}"]
+            for d, c, p in zip(_distancias.tolist(), curva["costos"].tolist(),
+                               (curva["costos"] / curva["asientos"]).tolist()))
+    return texto.getvalue().encode("utf-8")
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def cruces_curvas(sesion, grilla, ids, _curvas):
+    # Cruces exactos entre curvas, calculados sobre el modelo lineal a tramos
+    return cruces_entre_curvas(_curvas)
+
+
 with tab2:
     st.subheader("Comparar curvas de costos")
 
-    if "curvas" not in st.session_state:
+    if "sesion" not in st.session_state:
         st.session_state.curvas = []
+        st.session_state.siguiente_id = 0
+        st.session_state.sesion = uuid.uuid4().hex
+        st.session_state.clave_grilla = None
+
+    col_paso, col_maximo = st.columns(2)
+    paso_grilla = col_paso.number_input("Paso de distancia (km)", min_value=1, max_value=50, value=10, step=1, format="%d")
+    maximo_grilla = col_maximo.number_input("Distancia máxima (km)", min_value=10, max_value=500, value=100, step=10, format="%d")
+    sincronizar_grilla(paso_grilla, maximo_grilla)
 
     with st.form("form_curva"):
-        nombre = st.text_input("Nombre de la curva", value=f"Curva {len(st.session_state.curvas) + 1}")
+        nombre = st.text_input("Nombre de la curva", value=f"Curva {st.session_state.siguiente_id + 1}")
         tipo_motor_c = st.selectbox("Tipo de motor", [
             "motor fuera de borda",
             "motor interno nafta",
@@ -60,7 +168,7 @@ with tab2:
         if submitted:
             precio_benzina, precio_gasolio = obtener_precios_lombardia()
             precio_c = precio_gasolio if "diesel" in tipo_motor_c else precio_benzina
-            st.session_state.curvas.append({
+            agregar_curva({
                 "nombre": nombre,
                 "tipo_motor": tipo_motor_c,
                 "hp": hp_c,
@@ -72,69 +180,47 @@ with tab2:
             st.success(f"Curva '{nombre}' agregada")
 
     if st.session_state.curvas:
-        distancias = list(range(10, 101, 10))
-        fig, ax = plt.subplots(figsize=(6, 4))
-        csv_output = [["Curva", "Distancia (km)", "Costo (€)"]]
-
-        for curva in st.session_state.curvas:
-            costos = [calcular_costo(curva["tipo_motor"], curva["hp"], curva["vel"], curva["asientos"], d, curva["precio"], curva["espera"])[1] for d in distancias]
-            ax.plot(distancias, costos, marker='o', label=curva["nombre"])
-            for d, c in zip(distancias, costos):
-                csv_output.append([curva["nombre"], d, f"{c:.2f}"])
-
-        ax.set_title("Costo del viaje en función de la distancia")
-        ax.set_xlabel("Distancia (km)")
-        ax.set_ylabel("Costo (€)")
-        ax.grid(True)
-        ax.legend()
-        st.pyplot(fig)
-
-        # Gráfico de costo por asiento
-        fig2, ax2 = plt.subplots(figsize=(6, 4))
-        csv_output_asiento = [["Curva", "Distancia (km)", "Costo por asiento (€)"]]
-        for curva in st.session_state.curvas:
-            costos_por_asiento = []
-            for d in distancias:
-                costo_total = calcular_costo(curva["tipo_motor"], curva["hp"], curva["vel"], curva["asientos"], d, curva["precio"], curva["espera"])[1]
-                costo_asiento = costo_total / curva["asientos"]
-                costos_por_asiento.append(costo_asiento)
-                csv_output_asiento.append([curva["nombre"], d, f"{costo_asiento:.2f}"])
-            ax2.plot(distancias, costos_por_asiento, marker='s', label=curva["nombre"])
-        ax2.set_title("Costo por asiento en función de la distancia")
-        ax2.set_xlabel("Distancia (km)")
-        ax2.set_ylabel("Costo por asiento (€)")
-        ax2.grid(True)
-        ax2.legend()
-        st.pyplot(fig2)
+        curvas = st.session_state.curvas
+        distancias = st.session_state.distancias
+        clave = (st.session_state.sesion, st.session_state.clave_grilla, tuple(c["id"] for c in curvas))
+
+        # Una sola imagen (costo y costo por asiento) para mostrar y descargar
+        img_bytes = imagen_curvas(*clave, curvas, distancias)
+        st.image(img_bytes)
+
+        cruces = cruces_curvas(*clave, curvas)
+        if cruces:
+            with st.expander(f"Cruces de costo entre curvas ({len(cruces)})", expanded=len(curvas) <= 5):
+                st.dataframe([{"curvas": f"{c['curva_a']} / {c['curva_b']}", "desde (km)": round(c["distancia"], 2),
+                               "más barata": c["mas_barata"]} for c in cruces], hide_index=True)
 
         # Exportar CSV con ambos conjuntos de datos
-        csv_combined = StringIO()
-        writer = csv.writer(csv_combined)
-        writer.writerow(["Curva", "Distancia (km)", "Costo (€)", "", "Curva", "Distancia (km)", "Costo por asiento (€)"])
-        for row1, row2 in zip(csv_output[1:], csv_output_asiento[1:]):
-            writer.writerow(row1 + [""] + row2)
-        csv_bytes = csv_combined.getvalue().encode("utf-8")
-        st.download_button("📥 Descargar CSV", data=csv_bytes, file_name="curvas_costos.csv", mime="text/csv")
-
-        # Exportar imagen combinada
-        img_buffer = BytesIO()
-        fig_all, (ax_all1, ax_all2) = plt.subplots(2, 1, figsize=(6, 8))
-        for curva in st.session_state.curvas:
-            costos = [calcular_costo(curva["tipo_motor"], curva["hp"], curva["vel"], curva["asientos"], d, curva["precio"], curva["espera"])[1] for d in distancias]
-            ax_all1.plot(distancias, costos, marker='o', label=curva["nombre"])
-            costos_asiento = [c / curva["asientos"] for c in costos]
-            ax_all2.plot(distancias, costos_asiento, marker='s', label=curva["nombre"])
-        ax_all1.set_title("Costo del viaje (€)")
-        ax_all2.set_title("Costo por asiento (€)")
-        for ax in (ax_all1, ax_all2):
-            ax.set_xlabel("Distancia (km)")
-            ax.set_ylabel("Costo (€)")
-            ax.grid(True)
-            ax.legend()
-        fig_all.tight_layout()
-        fig_all.savefig(img_buffer, format="png")
-        st.download_button("🖼️ Descargar imagen", data=img_buffer.getvalue(), file_name="curvas_costos.png", mime="image/png")
-
-        # Botón para limpiar
-        if st.button("🗑️ Limpiar curvas"):
-            st.session_state.curvas = []
+        st.download_button("📥 Descargar CSV", data=csv_curvas(*clave, curvas, distancias),
+                           file_name="curvas_costos.csv", mime="text/csv")
+        st.download_button("🖼️ Descargar imagen", data=img_bytes, file_name="curvas_costos.png", mime="image/png")
+
+        # Quitar curvas sueltas o todas
+        nombres = {c["id"]: f"{c['nombre']} ({c['tipo_motor']}, {c['hp']} HP)" for c in curvas}
+        st.multiselect("Curvas a quitar", list(nombres), format_func=nombres.get, key="curvas_a_quitar")
+        col_quitar, col_limpiar = st.columns(2)
+        col_quitar.button("➖ Quitar seleccionadas", on_click=quitar_curvas)
+        col_limpiar.button("🗑️ Limpiar curvas", on_click=limpiar_curvas)
+
+# PANEL DE DEPURACIÓN: contadores y tramos del proceso (incluye los de esta ejecución)
+with panel_depuracion:
+    contadores = registro.contadores()
+    if contadores:
+        st.markdown("**Contadores**")
+        st.table([{"métrica": nombre, "valor": valor} for nombre, valor in contadores.items()])
+    tramos = registro.tramos()
+    if tramos:
+        st.markdown("**Tramos**")
+        st.table([{"tramo": nombre, "cuenta": datos["cuenta"], "media (ms)": f"{datos['media'] * 1e3:.3f}",
+                   "máximo (ms)": f"{datos['maximo'] * 1e3:.3f}"} for nombre, datos in tramos.items()])
+    st.markdown("**Caché de cotizaciones**")
+    st.json(cache_cotizaciones.estadisticas())
+    texto_metricas = registro.texto_prometheus()
+    st.download_button("Descargar métricas (Prometheus)", data=texto_metricas.encode("utf-8"),
+                       file_name="metricas_boater.prom", mime="text/plain")
+    if st.button("Reiniciar métricas"):
+        registro.limpiar()
@@ -0,0 +1,266 @@
+import argparse
+import glob
+import http.server
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from calculo_boater import calcular_costo, calcular_costos_batch
+import precios_combustible
+from precios_combustible import ProveedorPrecios, extraer_precios_lombardia, extraer_precios_regionales_cacheado
+from tarifas_boater import TariffTables, compilar_instantanea, obtener_tablas
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_RESULTADOS = os.path.join(DIRECTORIO, ".benchmarks")
+RUTA_PDF = os.path.join(DIRECTORIO, "MediaRegionaleStradale.pdf")
+DISTANCIAS = list(range(10, 101, 10))
+
+
+# Servidor HTTP local que sirve el PDF incluido en el repo, en lugar de mimit.gov.it
+class ServidorPdfLocal:
+    def __init__(self, ruta_pdf=RUTA_PDF):
+        with open(ruta_pdf, "rb") as f:
+            contenido = f.read()
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(contenido)))
+                self.end_headers()
+                self.wfile.write(contenido)
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._servidor.server_port}/MediaRegionaleStradale.pdf"
+
+    def __enter__(self):
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+
+# Ejecuta `funcion` hasta `repeticiones` veces (o hasta agotar `tiempo_max`) y devuelve estadísticas en segundos
+def medir(funcion, repeticiones=20, tiempo_max=5.0, preparar=None):
+    tiempos = []
+    inicio = time.perf_counter()
+    while len(tiempos) < repeticiones and (not tiempos or time.perf_counter() - inicio < tiempo_max):
+        if preparar is not None:
+            preparar()
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return {
+        "repeticiones": len(tiempos),
+        "min": min(tiempos),
+        "mediana": statistics.median(tiempos),
+        "media": statistics.fmean(tiempos),
+        "max": max(tiempos),
+    }
+
+
+def _lote_aleatorio(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    motores = np.array(["motor fuera de borda", "motor interno nafta", "motor interno diesel"])
+    return (rng.choice(motores, n), rng.integers(10, 300, n), rng.uniform(5, 40, n),
+            rng.integers(1, 30, n), rng.uniform(1, 100, n), rng.uniform(1.5, 2.0, n), rng.integers(0, 3, n))
+
+
+def _render_curvas(n_curvas=3):
+    # Dibujo completo de la pestaña de curvas (costo y costo por asiento), sin la caché de imágenes
+    from io import BytesIO
+    from render_curvas import crear_figura
+    curvas = [{"nombre": f"Curva {i + 1}", "asientos": 6,
+               "costos": calcular_costos_batch("motor interno nafta", 50 + 50 * i, 20, 6, DISTANCIAS, 1.8)[1]}
+              for i in range(n_curvas)]
+    crear_figura(curvas, DISTANCIAS).savefig(BytesIO(), format="png")
+
+
+def _flota_aleatoria(n, semilla=1):
+    from flota_boater import Flota
+    tipo_motor, hp, vel_crucero, asientos, _, precio, _ = _lote_aleatorio(n, semilla)
+    return Flota([f"Bote {i + 1}" for i in range(n)], tipo_motor, hp, vel_crucero, asientos, precio)
+
+
+def _lote_regiones_mixtas(n, semilla=3):
+    # Bloque de cotizar_lote con regiones de distinto largo y filas sin región: también sirve
+    # de caso de regresión (con dtype=str numpy recortaba los nombres al ancho del primero)
+    import pandas as pd
+    from cotizar_lote import cotizar_bloque
+    from matriz_precios import MatrizPrecios
+    matriz = MatrizPrecios.desde_filas([
+        ("Lombardia", "benzina", "2025-05-05", 1.686), ("Lombardia", "gasolio", "2025-05-05", 1.584),
+        ("Italia", "benzina", "2025-05-01", 1.72), ("Italia", "gasolio", "2025-05-01", 1.65),
+    ])
+    tipo_motor, hp, vel_crucero, asientos, distancia, _, espera = _lote_aleatorio(n, semilla)
+    bloque = pd.DataFrame({"tipo_motor": tipo_motor, "hp": hp, "vel_crucero": vel_crucero, "asientos": asientos,
+                           "distancia": distancia, "tiempo_espera": espera,
+                           "region": np.resize(np.array(["Italia", None, "Lombardia"], dtype=object), n)})
+    return lambda: cotizar_bloque(bloque, 1.84, 1.75, matriz)
+
+
+def _riesgo_contratos(n, meses=12, semilla=2):
+    # Un viaje por contrato y mes: 100k trayectorias de precios de `meses` meses
+    from riesgo_precios import ModeloRetornos, simular_costos
+    modelo = ModeloRetornos.desde_historial()
+    tipo_motor, hp, vel_crucero, asientos, distancia, _, espera = _lote_aleatorio(n * meses, semilla)
+    mes = np.repeat(np.arange(1, meses + 1), n)
+    contrato = np.tile(np.arange(n), meses)
+    return lambda: simular_costos(tipo_motor, hp, vel_crucero, asientos, distancia, espera, mes, contrato,
+                                  modelo=modelo, procesos=os.cpu_count() or 1)
+
+
+def casos_benchmark():
+    obtener_tablas()
+    lote = _lote_aleatorio(10_000)
+    with open(RUTA_PDF, "rb") as f:
+        contenido_pdf = f.read()
+    flota = _flota_aleatoria(200)
+    ruta_instantanea = os.path.join(tempfile.gettempdir(), "benchmark_boater.btar")
+    compilar_instantanea(os.path.join(DIRECTORIO, "Boater_excel.xlsx"), ruta_instantanea)
+    casos = {
+        "cotizacion_individual": (lambda: calcular_costo("motor interno nafta", 100, 20, 6, 37, 1.8, 1), {"repeticiones": 2000}),
+        "curva_10_puntos_escalar": (lambda: [calcular_costo("motor interno nafta", 100, 20, 6, d, 1.8) for d in DISTANCIAS], {"repeticiones": 500}),
+        "curva_10_puntos_batch": (lambda: calcular_costos_batch("motor interno nafta", 100, 20, 6, DISTANCIAS, 1.8), {"repeticiones": 500}),
+        "lote_10k": (lambda: calcular_costos_batch(*lote), {"repeticiones": 50}),
+        "lote_10k_regiones_mixtas": (_lote_regiones_mixtas(10_000), {"repeticiones": 20}),
+        "flota_200_botes_100k_viajes": (lambda: flota.asignar(np.resize(lote[3], 100_000), np.resize(lote[4], 100_000),
+                                                              np.resize(lote[6], 100_000)), {"repeticiones": 20}),
+        "riesgo_200_contratos_100k_trayectorias": (_riesgo_contratos(200), {"repeticiones": 3}),
+        "excel_frio": (lambda: TariffTables.desde_excel(os.path.join(DIRECTORIO, "Boater_excel.xlsx")), {"repeticiones": 10}),
+        "instantanea_fria": (lambda: TariffTables.desde_instantanea(ruta_instantanea), {"repeticiones": 2000}),
+        "excel_caliente": (lambda: obtener_tablas(), {"repeticiones": 2000}),
+        "pdf_lombardia": (lambda: extraer_precios_lombardia(RUTA_PDF), {"repeticiones": 5}),
+        "pdf_regiones_mismo_hash": (lambda: extraer_precios_regionales_cacheado(contenido_pdf), {"repeticiones": 200}),
+    }
+    try:
+        import matplotlib  # noqa: F401
+        casos["render_curvas"] = (_render_curvas, {"repeticiones": 5})
+    except ImportError:
+        pass
+    return casos
+
+
+# Casos que necesitan el servidor local del PDF; -k se aplica a cada nombre
+CASOS_SERVIDOR = ("precios_servidor_local_frio", "precios_servidor_local_caliente",
+                  "matriz_ciclo", "matriz_lote_100k_regiones")
+
+
+def _ejecutar_con_servidor(seleccionados):
+    resultados = {}
+    with ServidorPdfLocal() as servidor, tempfile.TemporaryDirectory() as directorio:
+        # Sin TTL: cada llamada descarga el PDF del servidor local, y sin las regiones ya
+        # extraídas (en memoria y en disco) también lo vuelve a parsear
+        def olvidar_regiones():
+            precios_combustible._regiones_por_hash.clear()
+            for ruta in glob.glob(os.path.join(directorio, "regiones_*.json")):
+                os.remove(ruta)
+
+        if "precios_servidor_local_frio" in seleccionados:
+            frio = ProveedorPrecios(url=servidor.url, directorio_cache=directorio, ttl=0)
+            resultados["precios_servidor_local_frio"] = medir(frio.obtener, repeticiones=5, preparar=olvidar_regiones)
+        caliente = ProveedorPrecios(url=servidor.url, directorio_cache=directorio)
+        caliente.obtener()
+        if "precios_servidor_local_caliente" in seleccionados:
+            resultados["precios_servidor_local_caliente"] = medir(caliente.obtener, repeticiones=2000)
+
+        # Ciclo completo de la matriz (PDF regional + CSV mensual) y un lote de 100k viajes
+        # repartidos entre todas las regiones
+        from matriz_precios import ProveedorMatriz, fuente_mensual, fuente_regional
+        fuentes = {"regional": lambda: fuente_regional(caliente), "mensual": fuente_mensual}
+        if "matriz_ciclo" in seleccionados:
+            resultados["matriz_ciclo"] = medir(lambda: ProveedorMatriz(fuentes).obtener(), repeticiones=10)
+        if "matriz_lote_100k_regiones" in seleccionados:
+            matriz = ProveedorMatriz(fuentes).obtener()
+            regiones = np.resize(np.array(matriz.regiones), 100_000)
+            motores = np.resize(np.array(["motor interno diesel", "motor fuera de borda"]), 100_000)
+            resultados["matriz_lote_100k_regiones"] = medir(lambda: matriz.precios_lote_motor(regiones, motores),
+                                                            repeticiones=20)
+    return resultados
+
+
+def ejecutar(filtro=None):
+    resultados = {}
+    for nombre, (funcion, opciones) in casos_benchmark().items():
+        if filtro and filtro not in nombre:
+            continue
+        resultados[nombre] = medir(funcion, **opciones)
+
+    seleccionados = [nombre for nombre in CASOS_SERVIDOR if not filtro or filtro in nombre]
+    if seleccionados:
+        resultados.update(_ejecutar_con_servidor(seleccionados))
+    return resultados
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIRECTORIO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def guardar(resultados, ruta=None):
+    commit = _commit_actual()
+    if ruta is None:
+        os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+        ruta = os.path.join(DIRECTORIO_RESULTADOS, f"{datetime.now():%Y%m%d_%H%M%S}_{commit}.json")
+    datos = {
+        "commit": commit,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "resultados": resultados,
+    }
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2)
+    return ruta
+
+
+# Compara las medianas de dos corridas guardadas
+def comparar(ruta_base, ruta_nueva):
+    with open(ruta_base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(ruta_nueva, encoding="utf-8") as f:
+        nueva = json.load(f)
+    print(f"{'caso':36} {base['commit']:>12} {nueva['commit']:>12}  cambio")
+    for nombre, datos in nueva["resultados"].items():
+        anterior = base["resultados"].get(nombre)
+        if anterior is None:
+            print(f"{nombre:36} {'-':>12} {datos['mediana'] * 1e3:>10.3f}ms")
+            continue
+        cambio = datos["mediana"] / anterior["mediana"]
+        print(f"{nombre:36} {anterior['mediana'] * 1e3:>10.3f}ms {datos['mediana'] * 1e3:>10.3f}ms  x{cambio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de costos y precios de Boater.")
+    parser.add_argument("-k", dest="filtro", help="Solo los casos cuyo nombre contiene este texto")
+    parser.add_argument("-o", "--salida", help="Archivo JSON de resultados (por defecto en .benchmarks/)")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVO"), help="Compara dos resultados JSON")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    resultados = ejecutar(args.filtro)
+    for nombre, datos in resultados.items():
+        print(f"{nombre:36} mediana {datos['mediana'] * 1e3:10.3f} ms  ({datos['repeticiones']} rep.)")
+    print(f"Resultados guardados en {guardar(resultados, args.salida)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
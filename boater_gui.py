@@ -1,15 +1,97 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
 import csv
-from calculo_boater import calcular_costo, obtener_precios_lombardia
-from io import BytesIO, StringIO
+import queue
+import threading
+from precios_combustible import obtener_proveedor
+from cache_cotizaciones import calcular_costo_cacheado, calcular_curva_cacheada
+from render_curvas import dibujar_figura, grilla_distancias
+
+INTERVALO_RESULTADOS_MS = 50
+PASO_POR_DEFECTO = 10
+MAXIMO_POR_DEFECTO = 100
+
+
+class Trabajo:
+    # Un pedido a Trabajador. `manejar(evento, valor)` se llama en el hilo de Tk con cada
+    # resultado; los eventos son los que produce el trabajo más "fin", "cancelado" y "error".
+    def __init__(self, tipo, manejar, datos):
+        self.tipo = tipo
+        self.manejar = manejar
+        self.datos = datos
+        self._cancelado = threading.Event()
+
+    def cancelar(self):
+        self._cancelado.set()
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+
+class Trabajador:
+    # Un solo hilo que ejecuta los trabajos en orden. Tk no es seguro entre hilos: los
+    # resultados quedan en una cola que la interfaz vacía con root.after.
+    def __init__(self):
+        self.trabajos = queue.Queue()
+        self.resultados = queue.Queue()
+        self._hilo = threading.Thread(target=self._ejecutar, name="boater-gui", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, tipo, manejar, **datos):
+        trabajo = Trabajo(tipo, manejar, datos)
+        self.trabajos.put(trabajo)
+        return trabajo
+
+    def _ejecutar(self):
+        while True:
+            trabajo = self.trabajos.get()
+            try:
+                # Cada trabajo es un generador de (evento, valor); entre un paso y el siguiente
+                # se revisa si fue cancelado
+                for evento, valor in getattr(self, "_" + trabajo.tipo)(trabajo):
+                    if trabajo.cancelado:
+                        break
+                    self.resultados.put((trabajo, evento, valor))
+                self.resultados.put((trabajo, "cancelado" if trabajo.cancelado else "fin", None))
+            except Exception as e:
+                self.resultados.put((trabajo, "error", e))
+
+    def _precios(self, trabajo):
+        yield "estado", "Obteniendo precios de combustible..."
+        return obtener_proveedor().obtener().como_tupla()
+
+    def _individual(self, trabajo):
+        d = trabajo.datos
+        precio_benzina, precio_gasolio = yield from self._precios(trabajo)
+        precio = precio_gasolio if d["tipo_motor"] == "motor interno diesel" else precio_benzina
+        costo_km, total = calcular_costo_cacheado(d["tipo_motor"], d["hp"], d["vel"], d["asientos"],
+                                                  d["distancia"], precio)
+        yield "resultado", (d["distancia"], precio, costo_km, total)
+
+    # Una curva por paso: la interfaz las dibuja a medida que llegan
+    def _curvas(self, trabajo):
+        curvas, distancias = trabajo.datos["curvas"], trabajo.datos["distancias"]
+        precio_benzina, precio_gasolio = yield from self._precios(trabajo)
+        for i, curva in enumerate(curvas):
+            if trabajo.cancelado:
+                return
+            precio = precio_gasolio if curva["tipo_motor"] == "motor interno diesel" else precio_benzina
+            costos = calcular_curva_cacheada(curva["tipo_motor"], curva["hp"], curva["vel"], curva["asientos"],
+                                             distancias, precio)[1]
+            yield "curva", (i, precio, costos)
+
 
 class BoaterApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Boater - Calculadora de Costos de Viaje")
+        # Empieza a descargar los precios en segundo plano al abrir la ventana
+        obtener_proveedor().obtener_en_segundo_plano()
+        self.trabajador = Trabajador()
+        self.trabajo_actual = None
+        self.curvas_por_graficar = []
+        self.root.after(INTERVALO_RESULTADOS_MS, self.atender_resultados)
         self.mostrar_inicio()
 
     def mostrar_inicio(self):
@@ -28,15 +110,42 @@ class BoaterApp:
     def curva_costos(self):
         self.limpiar()
         self.curvas_por_graficar = []
-        self.curva_actual = 0
-
-        frame = ttk.Frame(self.root, padding=20)
-        frame.pack()
 
         # Always show form to add curves
         self.formulario_costo(tipo="curva")
 
+    # Envía un trabajo al hilo de cálculo; el anterior se cancela (sus resultados pendientes
+    # se descartan en atender_resultados)
+    def enviar(self, tipo, manejar, **datos):
+        self.cancelar()
+        self.trabajo_actual = self.trabajador.enviar(tipo, manejar, **datos)
+        return self.trabajo_actual
+
+    def cancelar(self):
+        if self.trabajo_actual is not None:
+            self.trabajo_actual.cancelar()
+            self.trabajo_actual = None
+
+    # Vacía la cola de resultados en el hilo de Tk y se vuelve a programar
+    def atender_resultados(self):
+        try:
+            while True:
+                trabajo, evento, valor = self.trabajador.resultados.get_nowait()
+                if trabajo is not self.trabajo_actual or trabajo.cancelado:
+                    continue
+                if evento in ("fin", "error"):
+                    self.trabajo_actual = None
+                try:
+                    trabajo.manejar(evento, valor)
+                except tk.TclError:
+                    # La ventana del trabajo ya no existe
+                    pass
+        except queue.Empty:
+            pass
+        self.root.after(INTERVALO_RESULTADOS_MS, self.atender_resultados)
+
     def limpiar(self):
+        self.cancelar()
         for widget in self.root.winfo_children():
             widget.destroy()
 
@@ -79,83 +188,174 @@ class BoaterApp:
                 vel = float(entradas["vel_crucero"].get())
                 asientos = int(entradas["asientos"].get())
                 nombre = entradas.get("nombre", tk.StringVar()).get()
-
-                precio_benzina, precio_gasolio = obtener_precios_lombardia()
-                precio = precio_gasolio if tipo_motor == "motor interno diesel" else precio_benzina
-
-                if tipo == "individual":
-                    distancia = float(entradas["distancia"].get())
-                    costo_km, total = calcular_costo(tipo_motor, hp, vel, asientos, distancia, precio)
-                    messagebox.showinfo("Resultado",
-                        f"Costo por km: €{costo_km:.2f}\nCosto total para {distancia} km: €{total:.2f}\nPrecio usado: €{precio:.3f}/litro")
-                else:
-                    self.curvas_por_graficar.append({
-                        "nombre": nombre or f"Curva {len(self.curvas_por_graficar) + 1}",
-                        "tipo_motor": tipo_motor,
-                        "hp": hp,
-                        "vel": vel,
-                        "asientos": asientos,
-                        "precio": precio
-                    })
-                    # After adding a curve, ask if user wants to add more or plot
-                    if messagebox.askyesno("Agregar más curvas", "¿Deseas agregar otra curva?"):
-                        self.limpiar()
-                        self.formulario_costo(tipo="curva")
-                    else:
-                        self.graficar_curvas(self.curvas_por_graficar)
+                distancia = float(entradas["distancia"].get()) if tipo == "individual" else None
             except Exception as e:
                 messagebox.showerror("Error", str(e))
+                return
+
+            if tipo == "individual":
+                boton_calcular.config(state="disabled")
+                boton_cancelar.config(state="normal")
+                self.enviar("individual", resultado_individual, tipo_motor=tipo_motor, hp=hp, vel=vel,
+                            asientos=asientos, distancia=distancia)
+                return
+
+            # El precio de cada curva se obtiene al graficar, en el hilo de cálculo
+            self.curvas_por_graficar.append({
+                "nombre": nombre or f"Curva {len(self.curvas_por_graficar) + 1}",
+                "tipo_motor": tipo_motor,
+                "hp": hp,
+                "vel": vel,
+                "asientos": asientos,
+            })
+            # After adding a curve, ask if user wants to add more or plot
+            if messagebox.askyesno("Agregar más curvas", "¿Deseas agregar otra curva?"):
+                self.limpiar()
+                self.formulario_costo(tipo="curva")
+            else:
+                self.graficar_curvas(self.curvas_por_graficar)
 
-        ttk.Button(frame, text="Calcular", command=calcular).pack(pady=10)
+        def resultado_individual(evento, valor):
+            if evento == "estado":
+                estado.config(text=valor)
+                return
+            if evento == "resultado":
+                distancia, precio, costo_km, total = valor
+                messagebox.showinfo("Resultado",
+                    f"Costo por km: €{costo_km:.2f}\nCosto total para {distancia} km: €{total:.2f}\nPrecio usado: €{precio:.3f}/litro")
+                return
+            boton_calcular.config(state="normal")
+            boton_cancelar.config(state="disabled")
+            estado.config(text="")
+            if evento == "error":
+                messagebox.showerror("Error", str(valor))
+
+        def cancelar():
+            self.cancelar()
+            boton_calcular.config(state="normal")
+            boton_cancelar.config(state="disabled")
+            estado.config(text="Cancelado")
+
+        boton_calcular = ttk.Button(frame, text="Calcular", command=calcular)
+        boton_calcular.pack(pady=10)
+        boton_cancelar = ttk.Button(frame, text="Cancelar", command=cancelar, state="disabled")
+        if tipo == "individual":
+            boton_cancelar.pack()
+        estado = ttk.Label(frame, text="")
+        estado.pack()
         ttk.Button(frame, text="Volver al inicio", command=self.mostrar_inicio).pack()
 
     def graficar_curvas(self, curvas):
-        distancias = list(range(10, 101, 10))
-
         self.limpiar()
         frame = ttk.Frame(self.root, padding=10)
         frame.pack()
 
-        fig, ax = plt.subplots(figsize=(6, 4))
-
-        for curva in curvas:
-            costos = [calcular_costo(curva["tipo_motor"], curva["hp"], curva["vel"], curva["asientos"], d, curva["precio"])[1] for d in distancias]
-            ax.plot(distancias, costos, marker='o', label=curva["nombre"])
+        # Grilla de distancias: "Recalcular" vuelve a enviar todas las curvas con la grilla nueva
+        frame_grilla = ttk.Frame(frame)
+        frame_grilla.pack(fill='x')
+        ttk.Label(frame_grilla, text="Paso (km)").pack(side='left')
+        entrada_paso = ttk.Entry(frame_grilla, width=6)
+        entrada_paso.insert(0, str(PASO_POR_DEFECTO))
+        entrada_paso.pack(side='left', padx=5)
+        ttk.Label(frame_grilla, text="Distancia máxima (km)").pack(side='left')
+        entrada_maximo = ttk.Entry(frame_grilla, width=6)
+        entrada_maximo.insert(0, str(MAXIMO_POR_DEFECTO))
+        entrada_maximo.pack(side='left', padx=5)
 
-        ax.set_title("Costo del viaje en función de la distancia")
-        ax.set_xlabel("Distancia (km)")
-        ax.set_ylabel("Costo (€)")
-        ax.grid(True)
-        ax.legend()
+        progreso = ttk.Progressbar(frame, maximum=len(curvas), length=400)
+        progreso.pack(fill='x', pady=5)
+        estado = ttk.Label(frame, text="")
+        estado.pack()
 
+        # Figura de la pantalla: se vuelve a dibujar (a lo sumo una vez por vuelta del loop
+        # de Tk) a medida que llegan las curvas
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        fig = Figure(figsize=(6, 4))
         canvas = FigureCanvasTkAgg(fig, master=frame)
-        canvas.draw()
         canvas.get_tk_widget().pack()
 
-        ttk.Button(frame, text="Guardar imagen", command=lambda: fig.savefig('curva_costos.png')).pack(pady=5)
+        # Resultados ya calculados: los usan el gráfico y las exportaciones
+        calculo = {"distancias": None, "datos": [], "redibujo_pendiente": False}
+
+        def redibujar():
+            calculo["redibujo_pendiente"] = False
+            if not frame.winfo_exists():
+                return
+            datos = [d for d in calculo["datos"] if d is not None]
+            dibujar_figura(fig, datos, calculo["distancias"], paneles=("costo",))
+            canvas.draw_idle()
+
+        def recibir(evento, valor):
+            if evento == "estado":
+                estado.config(text=valor)
+            elif evento == "curva":
+                i, precio, costos = valor
+                curva = curvas[i]
+                calculo["datos"][i] = {"nombre": curva["nombre"], "asientos": curva["asientos"],
+                                       "precio": precio, "costos": costos}
+                hechas = sum(d is not None for d in calculo["datos"])
+                progreso.config(value=hechas)
+                estado.config(text=f"Curvas calculadas: {hechas} de {len(curvas)}")
+                if not calculo["redibujo_pendiente"]:
+                    calculo["redibujo_pendiente"] = True
+                    self.root.after_idle(redibujar)
+            else:
+                terminar("Listo" if evento == "fin" else f"Error: {valor}")
+
+        def terminar(texto):
+            estado.config(text=texto)
+            boton_cancelar.config(state="disabled")
+            boton_recalcular.config(state="normal")
+            hay_datos = "normal" if any(d is not None for d in calculo["datos"]) else "disabled"
+            boton_imagen.config(state=hay_datos)
+            boton_csv.config(state=hay_datos)
+
+        def calcular():
+            try:
+                paso = float(entrada_paso.get())
+                maximo = float(entrada_maximo.get())
+                if paso <= 0 or maximo < paso:
+                    raise ValueError("El paso debe ser positivo y menor o igual a la distancia máxima.")
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            calculo["distancias"] = grilla_distancias(paso, maximo)
+            calculo["datos"] = [None] * len(curvas)
+            progreso.config(value=0)
+            for boton in (boton_recalcular, boton_imagen, boton_csv):
+                boton.config(state="disabled")
+            boton_cancelar.config(state="normal")
+            redibujar()
+            self.enviar("curvas", recibir, curvas=curvas, distancias=calculo["distancias"])
+
+        def cancelar():
+            self.cancelar()
+            terminar("Cancelado")
 
         def guardar_csv():
-            csv_text = StringIO()
-            writer = csv.writer(csv_text)
-            writer.writerow(["Curva", "Distancia (km)", "Costo (€)"])
-            for curva in curvas:
-                for d in distancias:
-                    costo = calcular_costo(
-                        curva["tipo_motor"],
-                        curva["hp"],
-                        curva["vel"],
-                        curva["asientos"],
-                        d,
-                        curva["precio"]
-                    )[1]
-                    writer.writerow([curva["nombre"], d, f"{costo:.2f}"])
-            csv_bytes = csv_text.getvalue().encode("utf-8")
-            with open("curvas_costos.csv", "wb") as f:
-                f.write(csv_bytes)
-
-        ttk.Button(frame, text="Guardar CSV", command=guardar_csv).pack(pady=5)
+            # Escribe los costos ya calculados (las curvas canceladas antes de llegar no se incluyen)
+            with open("curvas_costos.csv", "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["Curva", "Distancia (km)", "Costo (€)"])
+                for curva in calculo["datos"]:
+                    if curva is None:
+                        continue
+                    writer.writerows([curva["nombre"], f"{d:g}", f"{costo:.2f}"]
+                                     for d, costo in zip(calculo["distancias"].tolist(), curva["costos"].tolist()))
+
+        boton_recalcular = ttk.Button(frame_grilla, text="Recalcular", command=calcular)
+        boton_recalcular.pack(side='left', padx=5)
+        boton_cancelar = ttk.Button(frame, text="Cancelar", command=cancelar)
+        boton_cancelar.pack(pady=5)
+        # La misma figura se muestra en pantalla y se guarda como imagen
+        boton_imagen = ttk.Button(frame, text="Guardar imagen", command=lambda: fig.savefig('curva_costos.png'))
+        boton_imagen.pack(pady=5)
+        boton_csv = ttk.Button(frame, text="Guardar CSV", command=guardar_csv)
+        boton_csv.pack(pady=5)
 
         ttk.Button(frame, text="Volver al inicio", command=self.mostrar_inicio).pack(pady=10)
+        calcular()
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from metricas_boater import registro
+from calculo_boater import calcular_costo, calcular_costos_batch
+from tarifas_boater import obtener_tablas
+
+CAPACIDAD_POR_DEFECTO = 50_000
+
+
+# Clave normalizada de una cotización. Sin espera, None, 0 o negativos dan el mismo costo.
+def normalizar_cotizacion(tipo_motor, hp, vel_crucero, asientos, distancia, precio_combustible, tiempo_espera=None):
+    espera = float(tiempo_espera) if tiempo_espera is not None and tiempo_espera > 0 else 0.0
+    return (tipo_motor.strip().lower(), float(hp), float(vel_crucero), float(asientos),
+            float(distancia), float(precio_combustible), espera)
+
+
+class CacheCotizaciones:
+    # Memoización de calcular_costo y de curvas completas con desalojo LRU, segura entre hilos.
+    # Las claves incluyen el mtime del Excel, así que al cambiar las tarifas no se sirven valores viejos.
+    def __init__(self, capacidad=CAPACIDAD_POR_DEFECTO):
+        self.capacidad = capacidad
+        self.aciertos = 0
+        self.fallos = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _buscar(self, clave):
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is None:
+                self.fallos += 1
+            else:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+        registro.contar("cotizaciones_cache_aciertos" if valor is not None else "cotizaciones_cache_fallos")
+        return valor
+
+    def _guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+
+    def calcular_costo(self, tipo_motor, hp, vel_crucero, asientos, distancia, precio_combustible, tiempo_espera=None):
+        cotizacion = normalizar_cotizacion(tipo_motor, hp, vel_crucero, asientos, distancia,
+                                           precio_combustible, tiempo_espera)
+        clave = (obtener_tablas().mtime,) + cotizacion
+        valor = self._buscar(clave)
+        if valor is None:
+            valor = calcular_costo(*cotizacion)
+            self._guardar(clave, valor)
+        return valor
+
+    # Curva completa con una sola clave (configuración y grilla de distancias): buscar punto por
+    # punto era más lento que recalcular la curva con calcular_costos_batch. Devuelve arrays
+    # de solo lectura (costo_por_km, costo_total), compartidos entre las llamadas.
+    def calcular_curva(self, tipo_motor, hp, vel_crucero, asientos, distancias, precio_combustible, tiempo_espera=None):
+        cotizacion = normalizar_cotizacion(tipo_motor, hp, vel_crucero, asientos, 0.0,
+                                           precio_combustible, tiempo_espera)
+        distancias = np.asarray(distancias, dtype=float)
+        clave = (obtener_tablas().mtime, "curva") + cotizacion + (distancias.tobytes(),)
+        valor = self._buscar(clave)
+        if valor is None:
+            tipo, hp, vel, asientos, _, precio, espera = cotizacion
+            valor = calcular_costos_batch(tipo, hp, vel, asientos, distancias, precio, espera)
+            for array in valor:
+                array.setflags(write=False)
+            self._guardar(clave, valor)
+        return valor
+
+    def estadisticas(self):
+        with self._lock:
+            return {"entradas": len(self._datos), "capacidad": self.capacidad,
+                    "aciertos": self.aciertos, "fallos": self.fallos}
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.aciertos = 0
+            self.fallos = 0
+
+
+# Caché compartida por todas las interfaces del proceso
+cache_cotizaciones = CacheCotizaciones()
+
+
+def calcular_costo_cacheado(tipo_motor, hp, vel_crucero, asientos, distancia, precio_combustible, tiempo_espera=None):
+    return cache_cotizaciones.calcular_costo(tipo_motor, hp, vel_crucero, asientos, distancia,
+                                             precio_combustible, tiempo_espera)
+
+
+def calcular_curva_cacheada(tipo_motor, hp, vel_crucero, asientos, distancias, precio_combustible, tiempo_espera=None):
+    return cache_cotizaciones.calcular_curva(tipo_motor, hp, vel_crucero, asientos, distancias,
+                                             precio_combustible, tiempo_espera)
@@ -1,103 +1,121 @@
-import pandas as pd
-import requests
-import pdfplumber
-import os
 import warnings
+import numpy as np
+from metricas_boater import registro
+from precios_combustible import obtener_proveedor
+from tarifas_boater import COEFICIENTES_MOTOR, obtener_tablas  # noqa: F401 (re-exportado)
 warnings.filterwarnings("ignore", category=UserWarning)
 
-# Nueva versión de la función obtener_precios_lombardia con valores por defecto en caso de error
+# Precios de Lombardía (benzina, gasolio). El proveedor los guarda en caché en memoria y en
+# disco, y si no hay red devuelve el último valor válido o los valores por defecto.
 def obtener_precios_lombardia():
-    url = "https://www.mimit.gov.it/images/stories/carburanti/MediaRegionaleStradale.pdf"
-    pdf_path = "MediaRegionaleStradale.pdf"
-    response = requests.get(url)
-    with open(pdf_path, "wb") as f:
-        f.write(response.content)
-
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                lines = text.split("\n")
-                for i, line in enumerate(lines):
-                    if "Lombardia" in line:
-                        try:
-                            gasolio_line = lines[i + 2]  # gasolio está dos líneas después
-                            benzina_line = lines[i + 3]  # benzina está tres líneas después
-                            precio_gasolio = float(gasolio_line.split()[-1].replace(',', '.'))
-                            precio_benzina = float(benzina_line.split()[-1].replace(',', '.'))
-                            return precio_benzina, precio_gasolio
-                        except (IndexError, ValueError):
-                            continue
-    except Exception:
-        pass
-
-    # Si no se encuentra o hay error, devolver valores por defecto
-    print("⚠️  No se pudieron obtener los precios actuales. Usando valores por defecto.")
-    return 1.84, 1.75
+    with registro.tramo("precios.obtener"):
+        return obtener_proveedor().obtener().como_tupla()
+
+
+# Precios (benzina, gasolio) de cualquier región del PDF del MIMIT. Sin PDF los valores por
+# defecto son solo de Lombardía: cualquier otra región da KeyError como en el caso regional.
+def obtener_precios_region(region):
+    precios = obtener_proveedor().obtener()
+    if precios.origen == "defecto":
+        if region.strip().casefold() != "lombardia":
+            raise KeyError(f"Región no encontrada en los precios por defecto (solo Lombardia): {region}")
+        return precios.como_tupla()
+    return precios.precios_region(region)
+
+
+# Distancia mínima facturada: 15 km para fuera de borda y 12 km para los demás motores.
+# Recibe un tipo de motor o un array de tipos (devuelve un array).
+def distancia_minima(tipo_motor):
+    if isinstance(tipo_motor, str):
+        return 15.0 if tipo_motor == "motor fuera de borda" else 12.0
+    return np.where(np.asarray(tipo_motor) == "motor fuera de borda", 15.0, 12.0)
 
 
 # Función para obtener el valor más cercano
 def obtener_valor_mas_cercano(col_list, valor):
     return min(col_list, key=lambda x: abs(float(x) - valor))
 
-def calcular_costo(tipo_motor, hp, vel_crucero, asientos, distancia, precio_combustible, tiempo_espera=None):
-    # Cargar las tablas desde Excel
-    df = pd.read_excel("Boater_excel.xlsx", sheet_name="Foglio1")
+# `tablas` permite cotizar con otra versión de tarifas (ver comparar_tarifas)
+def calcular_costo(tipo_motor, hp, vel_crucero, asientos, distancia, precio_combustible, tiempo_espera=None,
+                   tablas=None):
+    # Tablas del Excel cargadas una sola vez (se recargan si cambia el archivo)
+    with registro.tramo("calcular_costo.tablas"):
+        tablas = tablas or obtener_tablas()
 
-    # Procesar tabla HP
-    tabla_hp = df.set_index("Caballos de fuerza").iloc[0:3]
-    tabla_hp.index = tabla_hp.index.str.lower()
+    if tipo_motor not in tablas.coeficientes:
+        raise ValueError("Tipo de motor no reconocido.")
 
-    # Procesar tabla asientos
-    tabla_asientos = df.iloc[4:].dropna(how="all", axis=1).reset_index(drop=True)
+    # Factores de la columna más cercana en las tablas HP y asientos, y cálculo
+    with registro.tramo("calcular_costo.formula"):
+        factor_hp = tablas.factor_hp(tipo_motor, hp)
+        factor_asientos = tablas.factor_asientos(tipo_motor, asientos)
 
-    # Constantes por tipo de motor
-    coeficientes = {
-        "motor fuera de borda": 0.46,
-        "motor interno nafta": 0.30,
-        "motor interno diesel": 0.25,
-    }
+        consumo = (hp * tablas.coeficientes[tipo_motor]) / (vel_crucero * 1.852)
+        costo_por_km = consumo * 3 * precio_combustible * factor_hp * factor_asientos
+        costo_total = costo_por_km * max(distancia, distancia_minima(tipo_motor))
+        if tiempo_espera is not None and tiempo_espera > 0:
+            tarifa_por_hora = tablas.tarifa_espera(distancia)
+            if tarifa_por_hora is not None:
+                costo_total += tarifa_por_hora * tiempo_espera
+
+    return costo_por_km, costo_total
 
-    if tipo_motor not in coeficientes:
+COLUMNAS_BATCH = ("tipo_motor", "hp", "vel_crucero", "asientos", "distancia", "precio_combustible", "tiempo_espera")
+
+# Versión vectorizada de calcular_costo. Recibe arrays (o escalares, que se expanden por
+# broadcasting) o un DataFrame con las columnas de COLUMNAS_BATCH y devuelve los arrays
+# (costo_por_km, costo_total).
+def calcular_costos_batch(tipo_motor, hp=None, vel_crucero=None, asientos=None, distancia=None,
+                          precio_combustible=None, tiempo_espera=None, tablas=None):
+    if hasattr(tipo_motor, "columns"):
+        df = tipo_motor
+        tipo_motor, hp, vel_crucero, asientos, distancia, precio_combustible = (
+            df[c].to_numpy() for c in COLUMNAS_BATCH[:-1])
+        tiempo_espera = df["tiempo_espera"].to_numpy() if "tiempo_espera" in df.columns else None
+
+    with registro.tramo("calcular_costos_batch.tablas"):
+        tablas = tablas or obtener_tablas()
+
+    # Códigos de motor: una búsqueda por tipo distinto, no por fila
+    nombres, codigos = np.unique(np.asarray(tipo_motor), return_inverse=True)
+    if any(n not in tablas.coeficientes for n in nombres):
         raise ValueError("Tipo de motor no reconocido.")
+    codigos = codigos.reshape(np.shape(tipo_motor))
+    if tiempo_espera is None:
+        tiempo_espera = 0.0
+
+    codigos, hp, vel_crucero, asientos, distancia, precio_combustible, tiempo_espera = np.broadcast_arrays(
+        codigos, np.asarray(hp, dtype=float), np.asarray(vel_crucero, dtype=float),
+        np.asarray(asientos, dtype=float), np.asarray(distancia, dtype=float),
+        np.asarray(precio_combustible, dtype=float), np.asarray(tiempo_espera, dtype=float))
+
+    filas = np.array([tablas.motores.index(n) for n in nombres])[codigos]
+    coeficientes = np.array([tablas.coeficientes[n] for n in nombres])[codigos]
+    minimos = distancia_minima(nombres)[codigos]
+
+    factor_hp = tablas.factores_hp_lote(filas, hp)
+    factor_asientos = tablas.factores_asientos_lote(filas, asientos)
 
-    # Obtener columna más cercana en tabla HP
-    columnas_hp = [col for col in tabla_hp.columns if not pd.isnull(col)]
-    col_hp_cercano = obtener_valor_mas_cercano(columnas_hp, hp)
-    factor_hp = tabla_hp.loc[tipo_motor, col_hp_cercano]
-
-    # Procesar tabla de asientos
-    tabla_asientos.columns = tabla_asientos.iloc[1]
-    tabla_asientos = tabla_asientos.drop(index=[0,1]).reset_index(drop=True)
-    tabla_asientos["Asientos"] = tabla_asientos["Asientos"].str.lower()
-    columnas_asientos = [col for col in tabla_asientos.columns if not pd.isnull(col) and col != "Asientos"]
-    col_asientos_cercano = obtener_valor_mas_cercano(columnas_asientos, asientos)
-    fila_asientos = tabla_asientos[tabla_asientos["Asientos"] == tipo_motor]
-    factor_asientos = fila_asientos[col_asientos_cercano].values[0]
-
-    # Cálculo
-    consumo = (hp * coeficientes[tipo_motor]) / (vel_crucero * 1.852)
+    consumo = (hp * coeficientes) / (vel_crucero * 1.852)
     costo_por_km = consumo * 3 * precio_combustible * factor_hp * factor_asientos
-    if tipo_motor == "motor fuera de borda":
-        distancia_real = max(distancia, 15)  # mínimo 15 km para fuera de borda
-    else:
-        distancia_real = max(distancia, 12)  # mínimo 12 km para otros
-    costo_total = costo_por_km * distancia_real
-    if tiempo_espera is not None and tiempo_espera > 0:
-        # Buscar fila 'espera' y extraer columnas numéricas
-        fila_espera = df[df.eq("espera").any(axis=1)].reset_index(drop=True)
-        if not fila_espera.empty:
-            fila_espera = fila_espera.dropna(axis=1)
-            fila_espera.columns = fila_espera.columns.astype(str)
-            columnas_validas = [col for col in fila_espera.columns if col not in ["km", "Caballos de fuerza", "Asientos", "espera"]]
-            columnas_numericas = [float(c) for c in columnas_validas if c.replace('.', '', 1).isdigit()]
-            columna_espera = obtener_valor_mas_cercano(columnas_numericas, distancia)
-            columna_espera_str = str(int(columna_espera)) if columna_espera == int(columna_espera) else str(columna_espera)
-            tarifa_por_hora = float(fila_espera[columna_espera_str].values[0])
-            costo_total += tarifa_por_hora * tiempo_espera
+    costo_total = costo_por_km * np.maximum(distancia, minimos)
+    con_espera = tiempo_espera > 0
+    if con_espera.any():
+        costo_total = costo_total + np.where(con_espera, tablas.tarifas_espera_lote(distancia) * tiempo_espera, 0.0)
 
     return costo_por_km, costo_total
 
+# Cotiza el mismo viaje con varias versiones de tarifas. `versiones` es {nombre: ruta} con rutas
+# a Excel o instantáneas .btar (cada una se carga una vez y queda en memoria) o {nombre: TariffTables}.
+# Devuelve {nombre: (costo_por_km, costo_total)}.
+def comparar_tarifas(versiones, tipo_motor, hp, vel_crucero, asientos, distancia, precio_combustible,
+                     tiempo_espera=None):
+    return {
+        nombre: calcular_costo(tipo_motor, hp, vel_crucero, asientos, distancia, precio_combustible, tiempo_espera,
+                               tablas=tablas if hasattr(tablas, "coeficientes") else obtener_tablas(tablas))
+        for nombre, tablas in versiones.items()
+    }
+
 def calcular_costo_viaje():
     # Entradas del usuario
     tipo_motor = input("Tipo de motor (Motor fuera de borda / Motor interno nafta / Motor interno diesel): ").strip().lower()
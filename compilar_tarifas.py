@@ -0,0 +1,32 @@
+import argparse
+import os
+import sys
+from tarifas_boater import EXTENSION_INSTANTANEA, HOJA_EXCEL, compilar_instantanea
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compila Excel de tarifas a instantáneas binarias (.btar).")
+    parser.add_argument("excel", nargs="+", help="Excel de tarifas (por ejemplo Boater_excel.xlsx)")
+    parser.add_argument("-o", "--salida", default=".",
+                        help="Directorio de salida, o archivo .btar si se compila un solo Excel")
+    parser.add_argument("--version", help="Etiqueta de versión (por defecto, el nombre del Excel)")
+    parser.add_argument("--hoja", default=HOJA_EXCEL)
+    args = parser.parse_args(argv)
+
+    if args.salida.endswith(EXTENSION_INSTANTANEA) and len(args.excel) > 1:
+        parser.error("Con varios Excel, --salida debe ser un directorio")
+    if args.version and len(args.excel) > 1:
+        parser.error("--version solo se puede usar con un único Excel")
+    for ruta_excel in args.excel:
+        if args.salida.endswith(EXTENSION_INSTANTANEA):
+            ruta_salida = args.salida
+        else:
+            nombre = os.path.splitext(os.path.basename(ruta_excel))[0] + EXTENSION_INSTANTANEA
+            ruta_salida = os.path.join(args.salida, nombre)
+        tablas = compilar_instantanea(ruta_excel, ruta_salida, args.version or os.path.basename(ruta_excel), args.hoja)
+        print(f"{ruta_excel} -> {ruta_salida} (versión {tablas.version}, {os.path.getsize(ruta_salida)} bytes)",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
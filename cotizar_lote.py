@@ -0,0 +1,205 @@
+import argparse
+import os
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from calculo_boater import calcular_costos_batch, obtener_precios_lombardia
+from historial_precios import producto_para_motor
+
+TAMANO_BLOQUE = 100_000
+# Tipos fijos de las columnas conocidas: read_csv por bloques infiere los tipos en cada bloque
+# (un entero puede volver como float, un texto vacío como float) y el Parquet de salida
+# necesita el mismo esquema en todos los bloques. Las demás columnas se leen como texto y
+# pasan sin cambios a la salida.
+TIPOS_COLUMNAS = {
+    "tipo_motor": str, "region": str, "combustible": str,
+    "hp": float, "vel_crucero": float, "asientos": float, "distancia": float,
+    "precio_combustible": float, "tiempo_espera": float,
+}
+
+
+def _es_parquet(ruta):
+    return os.path.splitext(ruta)[1].lower() in (".parquet", ".pq")
+
+
+def _tiene_columna(ruta, columna):
+    if _es_parquet(ruta):
+        import pyarrow.parquet as pq
+        return columna in pq.ParquetFile(ruta).schema_arrow.names
+    import pandas as pd
+    return columna in pd.read_csv(ruta, nrows=0).columns
+
+
+# Lee el archivo de viajes por bloques de `tamano` filas sin cargarlo entero en memoria
+# (solo las `columnas` pedidas, si se indican)
+def leer_bloques(ruta, tamano=TAMANO_BLOQUE, columnas=None):
+    if _es_parquet(ruta):
+        import pyarrow.parquet as pq
+        archivo = pq.ParquetFile(ruta)
+        for lote in archivo.iter_batches(batch_size=tamano, columns=columnas):
+            bloque = lote.to_pandas()
+            # Las columnas numéricas conocidas pueden venir como texto o enteros
+            yield bloque.astype({c: t for c, t in TIPOS_COLUMNAS.items() if t is float and c in bloque.columns})
+    else:
+        import pandas as pd
+        yield from pd.read_csv(ruta, chunksize=tamano, usecols=columnas,
+                               dtype=defaultdict(lambda: str, TIPOS_COLUMNAS))
+
+
+# Filas del bloque que toman el precio de la matriz (con región y sin precio propio), con su
+# región y su combustible. Se convierten con dtype=object: con dtype=str numpy recorta los
+# nombres al ancho del primer valor si hay regiones vacías.
+def _filas_con_region(bloque):
+    con_region = bloque["region"].notna()
+    if "precio_combustible" in bloque.columns:
+        con_region &= bloque["precio_combustible"].isna()
+    con_region = con_region.to_numpy()
+    combustible = bloque.loc[con_region, "tipo_motor"].astype(str).str.strip().str.lower().map(producto_para_motor)
+    if "combustible" in bloque.columns:
+        combustible = bloque.loc[con_region, "combustible"].fillna(combustible)
+    return con_region, bloque.loc[con_region, "region"].to_numpy(dtype=object), combustible.to_numpy(dtype=object)
+
+
+# Revisa antes de cotizar que todas las regiones y combustibles del archivo tengan precio en
+# `matriz`, para no dejar una salida a medias ni costos NaN. Lanza ValueError con las filas.
+def verificar_precios_region(ruta, matriz, tamano=TAMANO_BLOQUE, max_errores=10):
+    columnas = [c for c in ("tipo_motor", "region", "combustible", "precio_combustible") if _tiene_columna(ruta, c)]
+    primera_fila = {}
+    inicio = 0
+    for bloque in leer_bloques(ruta, tamano, columnas):
+        con_region, regiones, combustibles = _filas_con_region(bloque)
+        for fila, par in zip(np.flatnonzero(con_region).tolist(), zip(regiones.tolist(), combustibles.tolist())):
+            primera_fila.setdefault(par, inicio + fila)
+        inicio += len(bloque)
+
+    errores = []
+    for (region, combustible), fila in sorted(primera_fila.items(), key=lambda item: item[1]):
+        try:
+            matriz.precio(region, combustible)
+        except KeyError as e:
+            errores.append(f"fila {fila + 1}: {e.args[0]}")
+    if errores:
+        resto = f" (y {len(errores) - max_errores} más)" if len(errores) > max_errores else ""
+        raise ValueError("Viajes sin precio de combustible: " + "; ".join(errores[:max_errores]) + resto)
+
+
+# Cotiza un bloque de viajes. Donde el bloque no trae "precio_combustible" se usa
+# el precio de gasolio para motores diesel y el de benzina para el resto. Si el bloque
+# trae "region" (y opcionalmente "combustible"), esas filas toman el precio de `matriz`.
+def cotizar_bloque(bloque, precio_benzina, precio_gasolio, matriz=None):
+    bloque = bloque.copy()
+    bloque["tipo_motor"] = bloque["tipo_motor"].astype(str).str.strip().str.lower()
+    precio_mimit = bloque["tipo_motor"].map(
+        lambda m: precio_gasolio if m == "motor interno diesel" else precio_benzina)
+    if matriz is not None and "region" in bloque.columns:
+        con_region, regiones, combustibles = _filas_con_region(bloque)
+        if con_region.any():
+            try:
+                precios = matriz.precios_lote(regiones, combustibles)
+            except KeyError as e:
+                raise ValueError(e.args[0]) from None
+            if np.isnan(precios).any():
+                fila = int(np.flatnonzero(np.isnan(precios))[0])
+                raise ValueError(f"Sin precio de {combustibles[fila]} en {regiones[fila]}")
+            precio_mimit = precio_mimit.astype(float)
+            precio_mimit[con_region] = precios
+    if "precio_combustible" in bloque.columns:
+        bloque["precio_combustible"] = bloque["precio_combustible"].fillna(precio_mimit)
+    else:
+        bloque["precio_combustible"] = precio_mimit
+    if "tiempo_espera" not in bloque.columns:
+        bloque["tiempo_espera"] = 0.0
+    bloque["tiempo_espera"] = bloque["tiempo_espera"].fillna(0.0)
+    bloque["costo_por_km"], bloque["costo_total"] = calcular_costos_batch(bloque)
+    return bloque
+
+
+class EscritorResultados:
+    # Escribe los bloques a medida que llegan (CSV o Parquet según la extensión)
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.parquet = _es_parquet(ruta)
+        self._writer = None
+        self._primero = True
+
+    def escribir(self, bloque):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.ruta, tabla.schema)
+            else:
+                # Una columna de texto vacía en todo el bloque llega sin tipo (null)
+                tabla = tabla.cast(self._writer.schema)
+            self._writer.write_table(tabla)
+        else:
+            bloque.to_csv(self.ruta, mode="w" if self._primero else "a", header=self._primero, index=False)
+        self._primero = False
+
+    def cerrar(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def cotizar_archivo(entrada, salida, tamano=TAMANO_BLOQUE, procesos=1, precio_benzina=None, precio_gasolio=None):
+    if precio_benzina is None or precio_gasolio is None:
+        benzina, gasolio = obtener_precios_lombardia()
+        precio_benzina = benzina if precio_benzina is None else precio_benzina
+        precio_gasolio = gasolio if precio_gasolio is None else precio_gasolio
+
+    # Un solo ciclo de precios para todo el archivo; a los procesos se envían solo los últimos precios
+    matriz = None
+    if _tiene_columna(entrada, "region"):
+        from matriz_precios import obtener_matriz
+        matriz = obtener_matriz().vigente()
+        verificar_precios_region(entrada, matriz, tamano)
+
+    escritor = EscritorResultados(salida)
+    filas = 0
+    try:
+        if procesos <= 1:
+            for bloque in leer_bloques(entrada, tamano):
+                escritor.escribir(cotizar_bloque(bloque, precio_benzina, precio_gasolio, matriz))
+                filas += len(bloque)
+        else:
+            # Como mucho 2 bloques pendientes por proceso, escritos en el orden de entrada
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                pendientes = deque()
+                for bloque in leer_bloques(entrada, tamano):
+                    pendientes.append(pool.submit(cotizar_bloque, bloque, precio_benzina, precio_gasolio, matriz))
+                    if len(pendientes) >= 2 * procesos:
+                        resultado = pendientes.popleft().result()
+                        escritor.escribir(resultado)
+                        filas += len(resultado)
+                while pendientes:
+                    resultado = pendientes.popleft().result()
+                    escritor.escribir(resultado)
+                    filas += len(resultado)
+    finally:
+        escritor.cerrar()
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cotiza un archivo de viajes (CSV o Parquet) por bloques.")
+    parser.add_argument("entrada", help="Archivo de viajes: tipo_motor, hp, vel_crucero, asientos, distancia "
+                                        "[, precio_combustible, tiempo_espera, region, combustible]")
+    parser.add_argument("salida", help="Archivo de resultados (.csv o .parquet)")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help="Filas por bloque")
+    parser.add_argument("--procesos", type=int, default=1, help="Procesos para cotizar bloques en paralelo")
+    parser.add_argument("--precio-benzina", type=float, help="Precio de benzina (por defecto, MIMIT)")
+    parser.add_argument("--precio-gasolio", type=float, help="Precio de gasolio (por defecto, MIMIT)")
+    args = parser.parse_args(argv)
+
+    try:
+        filas = cotizar_archivo(args.entrada, args.salida, args.bloque, args.procesos,
+                                args.precio_benzina, args.precio_gasolio)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    print(f"{filas} viajes cotizados en {args.salida}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import sys
+import numpy as np
+from calculo_boater import COEFICIENTES_MOTOR, calcular_costos_batch, distancia_minima, obtener_precios_lombardia
+from tarifas_boater import obtener_tablas
+
+# Columnas del archivo de flota (precio_combustible es opcional) y del archivo de viajes
+# (tiempo_espera y tipo_motor son opcionales; tipo_motor vacío = cualquier motor)
+COLUMNAS_FLOTA = ("nombre", "tipo_motor", "hp", "vel_crucero", "asientos")
+COLUMNAS_VIAJES = ("pasajeros", "distancia")
+
+
+class Flota:
+    # Coeficientes de cada bote calculados una sola vez. Para un bote fijo el costo de un viaje es
+    #   costo_por_km * max(distancia, distancia_minima) + tarifa_espera(distancia) * tiempo_espera
+    # y la espera no depende del bote, así que el bote más barato es el de menor
+    # costo_por_km * max(distancia, distancia_minima) entre los que tienen asientos suficientes.
+    def __init__(self, nombres, tipo_motor, hp, vel_crucero, asientos, precio_combustible):
+        self.nombres = np.asarray(nombres, dtype=str)
+        if len(self.nombres) == 0:
+            raise ValueError("La flota está vacía.")
+        self.tipo_motor = np.char.lower(np.char.strip(np.asarray(tipo_motor, dtype=str)))
+        self.asientos = np.asarray(asientos, dtype=float)
+        self.costo_por_km, _ = calcular_costos_batch(self.tipo_motor, hp, vel_crucero, self.asientos,
+                                                     0.0, precio_combustible)
+
+        # Índice por asientos: botes ordenados por capacidad y, por cada tipo de motor, el mejor
+        # bote entre los que tienen al menos esa capacidad (mínimo de sufijo de costo_por_km)
+        self._orden = np.argsort(self.asientos, kind="stable")
+        self._capacidades = self.asientos[self._orden]
+        self.motores = tuple(m for m in COEFICIENTES_MOTOR if (self.tipo_motor == m).any())
+        self._mejores = {m: self._mejores_por_capacidad(self.tipo_motor[self._orden] == m) for m in self.motores}
+
+    def _mejores_por_capacidad(self, es_motor):
+        costos = self.costo_por_km[self._orden]
+        mejores = np.full(len(costos) + 1, -1)
+        for i in range(len(costos) - 1, -1, -1):
+            mejores[i] = mejores[i + 1]
+            # Con costos iguales queda el bote más chico, para no ocupar los grandes
+            if es_motor[i] and (mejores[i] < 0 or costos[i] <= self.costo_por_km[mejores[i]]):
+                mejores[i] = self._orden[i]
+        return mejores
+
+    @classmethod
+    def desde_dataframe(cls, df, precio_benzina=None, precio_gasolio=None):
+        # Donde la flota no trae "precio_combustible" se usa gasolio para diesel y benzina para el resto
+        faltan = [c for c in COLUMNAS_FLOTA if c not in df.columns]
+        if faltan:
+            raise ValueError(f"Faltan columnas en la flota: {', '.join(faltan)}")
+        tipo_motor = df["tipo_motor"].astype(str).str.strip().str.lower().to_numpy()
+        if precio_benzina is None or precio_gasolio is None:
+            benzina, gasolio = obtener_precios_lombardia()
+            precio_benzina = benzina if precio_benzina is None else precio_benzina
+            precio_gasolio = gasolio if precio_gasolio is None else precio_gasolio
+        precios = np.where(tipo_motor == "motor interno diesel", precio_gasolio, precio_benzina)
+        if "precio_combustible" in df.columns:
+            propios = df["precio_combustible"].to_numpy(dtype=float)
+            precios = np.where(np.isnan(propios), precios, propios)
+        return cls(df["nombre"].to_numpy(), tipo_motor, df["hp"].to_numpy(dtype=float),
+                   df["vel_crucero"].to_numpy(dtype=float), df["asientos"].to_numpy(dtype=float), precios)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    # Bote más barato para cada viaje. Devuelve un dict de arrays: "bote" (índice en la flota,
+    # -1 si ningún bote tiene asientos suficientes), "costo_por_km" y "costo_total" (NaN sin bote).
+    def asignar(self, pasajeros, distancia, tiempo_espera=None, tipo_motor=None):
+        pasajeros, distancia = np.broadcast_arrays(np.asarray(pasajeros, dtype=float),
+                                                   np.asarray(distancia, dtype=float))
+        posicion = np.searchsorted(self._capacidades, pasajeros, side="left")
+        if tipo_motor is not None:
+            tipo_motor = np.broadcast_to(np.char.lower(np.char.strip(np.asarray(tipo_motor, dtype=str))),
+                                         pasajeros.shape)
+
+        # Un candidato por tipo de motor y viaje; se queda el de menor costo
+        candidatos = np.full((len(self.motores),) + pasajeros.shape, -1)
+        costos = np.full(candidatos.shape, np.inf)
+        for i, motor in enumerate(self.motores):
+            bote = self._mejores[motor][posicion]
+            if tipo_motor is not None:
+                bote = np.where((tipo_motor == "") | (tipo_motor == motor), bote, -1)
+            con_bote = bote >= 0
+            candidatos[i] = bote
+            costos[i] = np.where(con_bote, self.costo_por_km[bote] * np.maximum(distancia, distancia_minima(motor)),
+                                 np.inf)
+
+        elegido = np.argmin(costos, axis=0)[None]
+        bote = np.take_along_axis(candidatos, elegido, axis=0)[0]
+        costo_total = np.take_along_axis(costos, elegido, axis=0)[0]
+        sin_bote = ~np.isfinite(costo_total)
+        bote = np.where(sin_bote, -1, bote)
+
+        if tiempo_espera is not None:
+            tiempo_espera = np.broadcast_to(np.asarray(tiempo_espera, dtype=float), pasajeros.shape)
+            con_espera = tiempo_espera > 0
+            if con_espera.any():
+                tarifas = obtener_tablas().tarifas_espera_lote(distancia)
+                costo_total = costo_total + np.where(con_espera, tarifas * tiempo_espera, 0.0)
+
+        return {
+            "bote": bote,
+            "costo_por_km": np.where(sin_bote, np.nan, self.costo_por_km[bote]),
+            "costo_total": np.where(sin_bote, np.nan, costo_total),
+        }
+
+    # Agrega a los viajes las columnas de la asignación (bote, tipo de motor, costos)
+    def asignar_dataframe(self, viajes):
+        faltan = [c for c in COLUMNAS_VIAJES if c not in viajes.columns]
+        if faltan:
+            raise ValueError(f"Faltan columnas en los viajes: {', '.join(faltan)}")
+        tiempo_espera = viajes["tiempo_espera"].fillna(0.0).to_numpy(dtype=float) \
+            if "tiempo_espera" in viajes.columns else None
+        tipo_motor = viajes["tipo_motor"].fillna("").to_numpy(dtype=str) if "tipo_motor" in viajes.columns else None
+        asignacion = self.asignar(viajes["pasajeros"].to_numpy(dtype=float), viajes["distancia"].to_numpy(dtype=float),
+                                  tiempo_espera, tipo_motor)
+
+        bote = asignacion["bote"]
+        resultado = viajes.copy()
+        resultado["bote"] = np.where(bote >= 0, self.nombres[bote], "")
+        resultado["tipo_motor_bote"] = np.where(bote >= 0, self.tipo_motor[bote], "")
+        resultado["asientos_bote"] = np.where(bote >= 0, self.asientos[bote], np.nan)
+        resultado["costo_por_km"] = asignacion["costo_por_km"]
+        resultado["costo_total"] = asignacion["costo_total"]
+        return resultado
+
+
+def asignar_archivo(ruta_flota, ruta_viajes, salida, precio_benzina=None, precio_gasolio=None):
+    import pandas as pd
+    flota = Flota.desde_dataframe(pd.read_csv(ruta_flota), precio_benzina, precio_gasolio)
+    resultado = flota.asignar_dataframe(pd.read_csv(ruta_viajes))
+    resultado.to_csv(salida, index=False)
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Asigna a cada viaje el bote más barato de la flota.")
+    parser.add_argument("flota", help="CSV de la flota: nombre, tipo_motor, hp, vel_crucero, asientos "
+                                      "[, precio_combustible]")
+    parser.add_argument("viajes", help="CSV de viajes: pasajeros, distancia [, tiempo_espera, tipo_motor]")
+    parser.add_argument("salida", help="CSV de resultados")
+    parser.add_argument("--precio-benzina", type=float, help="Precio de benzina (por defecto, MIMIT)")
+    parser.add_argument("--precio-gasolio", type=float, help="Precio de gasolio (por defecto, MIMIT)")
+    args = parser.parse_args(argv)
+
+    resultado = asignar_archivo(args.flota, args.viajes, args.salida, args.precio_benzina, args.precio_gasolio)
+    sin_bote = int((resultado["bote"] == "").sum())
+    print(f"{len(resultado)} viajes asignados en {args.salida}"
+          + (f" ({sin_bote} sin bote con asientos suficientes)" if sin_bote else ""), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
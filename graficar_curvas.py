@@ -1,6 +1,7 @@
 
-import matplotlib.pyplot as plt
-from calculo_boater import calcular_costo, obtener_precios_lombardia
+from calculo_boater import obtener_precios_lombardia
+from cache_cotizaciones import calcular_curva_cacheada
+from render_curvas import dibujar_curvas
 
 def main():
     curvas = []
@@ -22,23 +23,15 @@ def main():
         else:
             precio_combustible = precio_benzina
         distancias = list(range(10, 101, 10))
-        costos = []
-        for d in distancias:
-            _, costo_total = calcular_costo(tipo_motor, hp, vel_crucero, asientos, d, precio_combustible)
-            costos.append(costo_total)
+        _, costos = calcular_curva_cacheada(tipo_motor, hp, vel_crucero, asientos, distancias, precio_combustible)
 
         curvas.append((nombre, distancias, costos))
 
     # Graficar
-    for nombre, distancias, costos in curvas:
-        plt.plot(distancias, costos, marker='o', label=nombre)
-
-    plt.title("Costo del viaje en función de la distancia")
-    plt.xlabel("Distancia (km)")
-    plt.ylabel("Costo (€)")
-    plt.grid(True)
-    plt.legend()
-    plt.tight_layout()
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots()
+    dibujar_curvas(ax, [{"nombre": nombre, "asientos": 1, "costos": costos} for nombre, _, costos in curvas], distancias)
+    fig.tight_layout()
     plt.show()
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+import csv
+import hashlib
+import os
+import threading
+from io import BytesIO
+import numpy as np
+from precios_combustible import DIRECTORIO_CACHE, escribir_atomico
+
+DIRECTORIO_DATOS = os.path.dirname(os.path.abspath(__file__))
+RUTA_HISTORIAL = os.path.join(DIRECTORIO_DATOS, "prezzi_carburanti_mensili_dati_completi_dal_1996_a_20250501.csv")
+
+# Alias de producto aceptados en las consultas
+ALIAS_PRODUCTOS = {
+    "gasolio": "gasolio auto",
+    "diesel": "gasolio auto",
+    "nafta": "benzina",
+}
+
+
+def normalizar_producto(producto):
+    producto = producto.strip().lower()
+    return ALIAS_PRODUCTOS.get(producto, producto)
+
+
+# Producto MIMIT correspondiente a cada tipo de motor
+def producto_para_motor(tipo_motor):
+    return "gasolio auto" if tipo_motor == "motor interno diesel" else "benzina"
+
+
+# Lee los CSV mensuales del MIMIT (separador ";", miles con "." y decimales con ",").
+# Los precios vienen en €/1000 litros; se devuelven en €/litro. Se ignoran las filas
+# de año y trimestre (CODICE_MESE > 12) y los precios en 0 (producto sin cotización).
+def leer_csv_mimit(ruta):
+    filas = []
+    with open(ruta, newline="", encoding="utf-8") as f:
+        for fila in csv.DictReader(f, delimiter=";"):
+            mes = int(fila["CODICE_MESE"])
+            precio = float(fila["PREZZO"].replace(".", "").replace(",", "."))
+            if mes > 12 or precio <= 0:
+                continue
+            filas.append((int(fila["ANNO"]), mes, normalizar_producto(fila["NOME_PRODOTTO"]), precio / 1000))
+    return filas
+
+
+class HistorialPrecios:
+    # Precios mensuales en un cubo año x mes x producto: cada consulta es un acceso
+    # directo por índice. Los meses sin dato quedan en NaN.
+    def __init__(self, precios, anio_inicial, productos):
+        self.precios = precios
+        self.anio_inicial = int(anio_inicial)
+        self.productos = tuple(productos)
+        self._indice_producto = {p: i for i, p in enumerate(self.productos)}
+
+    @classmethod
+    def desde_filas(cls, filas):
+        anios = [f[0] for f in filas]
+        productos = sorted({f[2] for f in filas})
+        indice = {p: i for i, p in enumerate(productos)}
+        anio_inicial = min(anios)
+        precios = np.full((max(anios) - anio_inicial + 1, 12, len(productos)), np.nan)
+        for anio, mes, producto, precio in filas:
+            precios[anio - anio_inicial, mes - 1, indice[producto]] = precio
+        return cls(precios, anio_inicial, productos)
+
+    @property
+    def anio_final(self):
+        return self.anio_inicial + self.precios.shape[0] - 1
+
+    def _producto(self, producto):
+        try:
+            return self._indice_producto[normalizar_producto(producto)]
+        except KeyError:
+            raise ValueError(f"Producto no reconocido: {producto}") from None
+
+    def precio(self, producto, anio, mes):
+        i = anio - self.anio_inicial
+        if not (0 <= i < self.precios.shape[0] and 1 <= mes <= 12):
+            raise KeyError(f"Sin datos para {mes:02d}/{anio}")
+        valor = self.precios[i, mes - 1, self._producto(producto)]
+        if np.isnan(valor):
+            raise KeyError(f"Sin precio de {producto} para {mes:02d}/{anio}")
+        return float(valor)
+
+    # Consulta vectorizada: NaN donde no hay dato
+    def precios_lote(self, producto, anios, meses):
+        anios = np.asarray(anios) - self.anio_inicial
+        meses = np.asarray(meses) - 1
+        validos = (anios >= 0) & (anios < self.precios.shape[0]) & (meses >= 0) & (meses < 12)
+        resultado = np.full(np.broadcast(anios, meses).shape, np.nan)
+        anios, meses, validos = np.broadcast_arrays(anios, meses, validos)
+        resultado[validos] = self.precios[anios[validos], meses[validos], self._producto(producto)]
+        return resultado
+
+    # Serie mensual completa de un producto: (anios, meses, precios) sin los meses vacíos
+    def serie(self, producto):
+        valores = self.precios[:, :, self._producto(producto)].ravel()
+        anios = np.repeat(np.arange(self.anio_inicial, self.anio_final + 1), 12)
+        meses = np.tile(np.arange(1, 13), self.precios.shape[0])
+        validos = ~np.isnan(valores)
+        return anios[validos], meses[validos], valores[validos]
+
+    def guardar(self, ruta):
+        buffer = BytesIO()
+        np.savez(buffer, precios=self.precios, anio_inicial=self.anio_inicial,
+                 productos=np.array(self.productos))
+        escribir_atomico(ruta, buffer.getvalue())
+
+    @classmethod
+    def abrir(cls, ruta):
+        with np.load(ruta) as datos:
+            return cls(datos["precios"], int(datos["anio_inicial"]), [str(p) for p in datos["productos"]])
+
+
+def _clave_cache(rutas):
+    h = hashlib.sha1()
+    for ruta in rutas:
+        estado = os.stat(ruta)
+        h.update(f"{os.path.abspath(ruta)}:{estado.st_mtime_ns}:{estado.st_size}".encode())
+    return h.hexdigest()[:16]
+
+
+_historiales = {}
+_lock_historial = threading.Lock()
+
+
+# Historial de precios a partir de uno o más CSV del MIMIT. El resultado se guarda
+# como .npz en el directorio de caché y solo se vuelve a leer el CSV si cambió.
+def cargar_historial(rutas=(RUTA_HISTORIAL,), directorio_cache=DIRECTORIO_CACHE):
+    if isinstance(rutas, str):
+        rutas = (rutas,)
+    clave = _clave_cache(rutas)
+    historial = _historiales.get(clave)
+    if historial is not None:
+        return historial
+
+    with _lock_historial:
+        historial = _historiales.get(clave)
+        if historial is None:
+            ruta_cache = os.path.join(directorio_cache, f"historial_{clave}.npz")
+            try:
+                historial = HistorialPrecios.abrir(ruta_cache)
+            except (OSError, ValueError, KeyError):
+                filas = [fila for ruta in rutas for fila in leer_csv_mimit(ruta)]
+                historial = HistorialPrecios.desde_filas(filas)
+                historial.guardar(ruta_cache)
+            _historiales[clave] = historial
+    return historial
+
+
+# Precios históricos (benzina, gasolio) de un mes, en el mismo formato que obtener_precios_lombardia
+def precios_historicos(anio, mes):
+    historial = cargar_historial()
+    return historial.precio("benzina", anio, mes), historial.precio("gasolio auto", anio, mes)
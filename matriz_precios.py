@@ -0,0 +1,242 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import numpy as np
+from historial_precios import RUTA_HISTORIAL, cargar_historial, normalizar_producto, producto_para_motor
+from metricas_boater import registro
+from precios_combustible import DIRECTORIO_CACHE, PRECIOS_POR_DEFECTO, ProveedorPrecios, escribir_atomico, \
+    obtener_proveedor
+
+REGION_POR_DEFECTO = "Lombardia"
+REGION_NACIONAL = "Italia"
+SUFIJO_AUTOSTRADA = " (autostrada)"
+TTL_MATRIZ = 300  # segundos; cada fuente mantiene además su propia caché
+TIMEOUT_DESCARGA = (5, 60)
+
+
+class MatrizPrecios:
+    # Precios en un array región x producto x fecha (NaN donde no hay dato). Las regiones,
+    # productos y fechas se resuelven a índices con diccionarios: cada consulta es O(1).
+    # Las fechas son cadenas ISO ("2025-05-05"); los datos mensuales usan el día 1.
+    def __init__(self, precios, regiones, productos, fechas):
+        self.precios = precios
+        self.regiones = tuple(regiones)
+        self.productos = tuple(productos)
+        self.fechas = tuple(fechas)
+        self._indice_region = {r.casefold(): i for i, r in enumerate(self.regiones)}
+        self._indice_producto = {p: i for i, p in enumerate(self.productos)}
+        self._indice_fecha = {f: i for i, f in enumerate(self.fechas)}
+        # Último precio disponible de cada región y producto
+        con_dato = ~np.isnan(precios)
+        ultima = precios.shape[2] - 1 - np.argmax(con_dato[:, :, ::-1], axis=2)
+        self.ultimos = np.where(con_dato.any(axis=2),
+                                np.take_along_axis(precios, ultima[:, :, None], axis=2)[:, :, 0], np.nan)
+        self.huella = hashlib.sha1(repr((self.regiones, self.productos, self.fechas)).encode()
+                                   + np.ascontiguousarray(precios).tobytes()).hexdigest()[:16]
+
+    # Filas (región, producto, fecha, precio); si se repite una celda queda la última fila
+    @classmethod
+    def desde_filas(cls, filas):
+        regiones = sorted({f[0] for f in filas})
+        productos = sorted({normalizar_producto(f[1]) for f in filas})
+        fechas = sorted({f[2] for f in filas})
+        indice_region = {r: i for i, r in enumerate(regiones)}
+        indice_producto = {p: i for i, p in enumerate(productos)}
+        indice_fecha = {f: i for i, f in enumerate(fechas)}
+        precios = np.full((len(regiones), len(productos), len(fechas)), np.nan)
+        for region, producto, fecha, precio in filas:
+            precios[indice_region[region], indice_producto[normalizar_producto(producto)], indice_fecha[fecha]] = precio
+        return cls(precios, regiones, productos, fechas)
+
+    def _region(self, region):
+        try:
+            return self._indice_region[region.strip().casefold()]
+        except KeyError:
+            raise KeyError(f"Región no encontrada en los precios: {region}") from None
+
+    def _producto(self, producto):
+        try:
+            return self._indice_producto[normalizar_producto(producto)]
+        except KeyError:
+            raise KeyError(f"Producto no encontrado en los precios: {producto}") from None
+
+    # Precio de un producto en una región; sin fecha, el último disponible
+    def precio(self, region, producto, fecha=None):
+        r, p = self._region(region), self._producto(producto)
+        if fecha is None:
+            valor = self.ultimos[r, p]
+        else:
+            if fecha not in self._indice_fecha:
+                raise KeyError(f"Sin precios para la fecha {fecha}")
+            valor = self.precios[r, p, self._indice_fecha[fecha]]
+        if np.isnan(valor):
+            raise KeyError(f"Sin precio de {producto} en {region}" + (f" para {fecha}" if fecha else ""))
+        return float(valor)
+
+    def precio_motor(self, region, tipo_motor, fecha=None):
+        return self.precio(region, producto_para_motor(tipo_motor), fecha)
+
+    # Últimos precios de un lote: `regiones` y `productos` son arrays (o escalares) de nombres.
+    # Cada nombre distinto se resuelve una sola vez. NaN donde la región no tiene ese producto.
+    def precios_lote(self, regiones, productos):
+        regiones, productos = np.broadcast_arrays(np.asarray(regiones, dtype=str), np.asarray(productos, dtype=str))
+        nombres_r, codigos_r = np.unique(regiones, return_inverse=True)
+        nombres_p, codigos_p = np.unique(productos, return_inverse=True)
+        filas = np.array([self._region(n) for n in nombres_r], dtype=int)[codigos_r]
+        columnas = np.array([self._producto(n) for n in nombres_p], dtype=int)[codigos_p]
+        return self.ultimos[filas, columnas].reshape(regiones.shape)
+
+    def precios_lote_motor(self, regiones, tipos_motor):
+        tipos_motor = np.asarray(tipos_motor, dtype=str)
+        productos = np.where(tipos_motor == "motor interno diesel", producto_para_motor("motor interno diesel"),
+                             producto_para_motor("motor fuera de borda"))
+        return self.precios_lote(regiones, productos)
+
+    # Matriz con solo la última fecha de cada celda (liviana para enviar a otros procesos)
+    def vigente(self):
+        return MatrizPrecios(self.ultimos[:, :, None].copy(), self.regiones, self.productos, ("vigente",))
+
+
+# Fuentes: funciones sin argumentos que devuelven filas (región, producto, fecha, precio)
+
+def _filas_regionales(precios, sufijo=""):
+    fecha = date.fromtimestamp(precios.obtenido).isoformat()
+    return [(region + sufijo, producto, fecha, precio)
+            for region, productos in precios.regiones.items() for producto, precio in productos.items()]
+
+
+# Medias regionales en ruta (PDF del MIMIT). Sin datos regionales quedan solo los precios
+# de Lombardía que devuelve el proveedor, incluidos los valores por defecto.
+def fuente_regional(proveedor=None):
+    precios = (proveedor or obtener_proveedor()).obtener()
+    if precios.origen == "defecto" or not precios.regiones:
+        fecha = date.fromtimestamp(precios.obtenido).isoformat()
+        benzina, gasolio = precios.como_tupla()
+        return [(REGION_POR_DEFECTO, "benzina", fecha, benzina), (REGION_POR_DEFECTO, "gasolio", fecha, gasolio)]
+    return _filas_regionales(precios)
+
+
+def _descargar_a_cache(url, nombre, directorio_cache=DIRECTORIO_CACHE, ttl=TTL_MATRIZ):
+    import requests
+    ruta = os.path.join(directorio_cache, nombre)
+    if os.path.exists(ruta) and time.time() - os.path.getmtime(ruta) < ttl:
+        return ruta
+    with registro.tramo("matriz.descarga", fuente=nombre):
+        respuesta = requests.get(url, timeout=TIMEOUT_DESCARGA)
+        respuesta.raise_for_status()
+    escribir_atomico(ruta, respuesta.content)
+    return ruta
+
+
+# Serie mensual nacional (CSV del MIMIT, bundled o descargado de `url`)
+def fuente_mensual(url=None, ruta=RUTA_HISTORIAL):
+    if url:
+        ruta = _descargar_a_cache(url, "prezzi_mensili_nazionali.csv")
+    historial = cargar_historial((ruta,))
+    filas = []
+    for producto in historial.productos:
+        anios, meses, valores = historial.serie(producto)
+        filas.extend((REGION_NACIONAL, producto, f"{anio}-{mes:02d}-01", float(valor))
+                     for anio, mes, valor in zip(anios.tolist(), meses.tolist(), valores.tolist()))
+    return filas
+
+
+_proveedores_autostrada = {}
+
+
+# PDF de medias regionales en autopista, con el mismo formato que el de ruta (el proveedor
+# exige que incluya Lombardia). Las regiones quedan como "Lombardia (autostrada)".
+def fuente_autostrada(url):
+    proveedor = _proveedores_autostrada.get(url)
+    if proveedor is None:
+        proveedor = _proveedores_autostrada.setdefault(url, ProveedorPrecios(
+            url=url, directorio_cache=os.path.join(DIRECTORIO_CACHE, "autostrada")))
+    precios = proveedor.obtener()
+    if precios.origen == "defecto" or not precios.regiones:
+        raise ValueError("No se pudieron obtener los precios en autopista.")
+    return _filas_regionales(precios, SUFIJO_AUTOSTRADA)
+
+
+def fuentes_configuradas():
+    fuentes = {
+        "regional": fuente_regional,
+        "mensual": lambda: fuente_mensual(os.environ.get("BOATER_URL_MENSUAL")),
+    }
+    url_autostrada = os.environ.get("BOATER_URL_AUTOSTRADA")
+    if url_autostrada:
+        fuentes["autostrada"] = lambda: fuente_autostrada(url_autostrada)
+    return fuentes
+
+
+class ProveedorMatriz:
+    # Consulta todas las fuentes en paralelo y las une en una MatrizPrecios, que queda vigente
+    # `ttl` segundos: un lote con muchas regiones se cotiza con un solo ciclo de consultas.
+    # Si una fuente falla se usan las demás.
+    def __init__(self, fuentes=None, ttl=TTL_MATRIZ):
+        self.fuentes = fuentes
+        self.ttl = ttl
+        self._matriz = None
+        self._obtenida = 0.0
+        self._lock = threading.Lock()
+        self._en_curso = None
+        self._lock_en_curso = threading.Lock()
+        self._pool = None
+
+    def _consultar(self):
+        fuentes = self.fuentes if self.fuentes is not None else fuentes_configuradas()
+        filas = []
+        with registro.tramo("matriz.ciclo"), ThreadPoolExecutor(max_workers=len(fuentes) or 1) as pool:
+            futuros = {nombre: pool.submit(fuente) for nombre, fuente in fuentes.items()}
+            for nombre, futuro in futuros.items():
+                try:
+                    filas.extend(futuro.result())
+                except Exception:
+                    registro.contar("matriz_fallos_fuente", fuente=nombre)
+        if not filas:
+            benzina, gasolio = PRECIOS_POR_DEFECTO
+            hoy = date.today().isoformat()
+            filas = [(REGION_POR_DEFECTO, "benzina", hoy, benzina), (REGION_POR_DEFECTO, "gasolio", hoy, gasolio)]
+        return MatrizPrecios.desde_filas(filas)
+
+    def _vigente(self):
+        return self._matriz is not None and time.time() - self._obtenida < self.ttl
+
+    def obtener(self, bloquear=True):
+        if self._vigente():
+            return self._matriz
+        if not bloquear and self._matriz is not None:
+            # Se sirve la matriz anterior mientras se renueva en un hilo de fondo
+            self._renovar_en_segundo_plano()
+            return self._matriz
+        with self._lock:
+            if not self._vigente():
+                self._matriz = self._consultar()
+                self._obtenida = time.time()
+            return self._matriz
+
+    def _renovar_en_segundo_plano(self):
+        with self._lock_en_curso:
+            if self._en_curso is None or self._en_curso.done():
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="matriz")
+                self._en_curso = self._pool.submit(self.obtener)
+
+
+_proveedor_matriz = None
+_lock_proveedor_matriz = threading.Lock()
+
+
+def obtener_proveedor_matriz():
+    global _proveedor_matriz
+    if _proveedor_matriz is None:
+        with _lock_proveedor_matriz:
+            if _proveedor_matriz is None:
+                _proveedor_matriz = ProveedorMatriz(ttl=float(os.environ.get("BOATER_TTL_MATRIZ", TTL_MATRIZ)))
+    return _proveedor_matriz
+
+
+def obtener_matriz(bloquear=True):
+    return obtener_proveedor_matriz().obtener(bloquear)
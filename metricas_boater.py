@@ -0,0 +1,194 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+PREFIJO = "boater_"
+# Límites (en segundos) de las cubetas del histograma de duración de los tramos
+LIMITES_HISTOGRAMA = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+# Solo un cProfile puede estar activo a la vez en el proceso
+_lock_perfil = threading.Lock()
+# Captura activa en el hilo o tarea asyncio actual
+_captura_actual = ContextVar("captura_metricas", default=None)
+
+
+def _clave(nombre, etiquetas):
+    if not etiquetas:
+        return nombre, ()
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas_texto(etiquetas):
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in etiquetas) + "}"
+
+
+def _nombre_legible(clave):
+    nombre, etiquetas = clave
+    return nombre + _etiquetas_texto(etiquetas)
+
+
+class Captura:
+    # Tramos medidos en el hilo o tarea actual durante una petición y, si se pidió, el perfil cProfile
+    def __init__(self, perfil=None):
+        self.tramos = []  # (nombre, segundos), en el orden en que terminan
+        self.perfil = perfil
+
+    def resumen_perfil(self, lineas=25, orden="cumulative"):
+        if self.perfil is None:
+            return None
+        import io
+        import pstats
+        salida = io.StringIO()
+        pstats.Stats(self.perfil, stream=salida).sort_stats(orden).print_stats(lineas)
+        return salida.getvalue()
+
+
+class _Tramo:
+    # Context manager de RegistroMetricas.tramo (sin generador: se usa en el camino caliente)
+    __slots__ = ("registro", "nombre", "etiquetas", "inicio")
+
+    def __init__(self, registro, nombre, etiquetas):
+        self.registro = registro
+        self.nombre = nombre
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registro.observar(self.nombre, time.perf_counter() - self.inicio, **self.etiquetas)
+        return False
+
+
+class _TramoInactivo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_TRAMO_INACTIVO = _TramoInactivo()
+
+
+class RegistroMetricas:
+    # Contadores y duraciones por tramo en memoria del proceso, seguros entre hilos.
+    # Se exportan en formato de texto de Prometheus con texto_prometheus().
+    # Con activo=False contar/tramo no hacen nada (BOATER_METRICAS=0 en el registro global).
+    def __init__(self, limites=LIMITES_HISTOGRAMA, activo=True):
+        self.limites = tuple(limites)
+        self.activo = activo
+        self._contadores = {}
+        self._tramos = {}  # clave -> [cuenta, suma, máximo, cubetas...]
+        self._lock = threading.Lock()
+
+    def contar(self, nombre, cantidad=1, **etiquetas):
+        if not self.activo:
+            return
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + cantidad
+
+    def observar(self, nombre, segundos, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            datos = self._tramos.get(clave)
+            if datos is None:
+                datos = self._tramos[clave] = [0, 0.0, 0.0] + [0] * len(self.limites)
+            datos[0] += 1
+            datos[1] += segundos
+            if segundos > datos[2]:
+                datos[2] = segundos
+            cubeta = bisect.bisect_left(self.limites, segundos)
+            if cubeta < len(self.limites):
+                datos[3 + cubeta] += 1
+        captura = _captura_actual.get()
+        if captura is not None:
+            captura.tramos.append((_nombre_legible(clave), segundos))
+
+    # Mide la duración del bloque `with` como un tramo con nombre
+    def tramo(self, nombre, **etiquetas):
+        if not self.activo:
+            return _TRAMO_INACTIVO
+        return _Tramo(self, nombre, etiquetas)
+
+    # Registra los tramos del hilo (o tarea asyncio) actual durante el bloque; con perfilar=True
+    # también captura un perfil cProfile (si ya hay otro perfil activo en el proceso, se omite).
+    @contextmanager
+    def capturar(self, perfilar=False):
+        perfil = None
+        if perfilar and _lock_perfil.acquire(blocking=False):
+            import cProfile
+            perfil = cProfile.Profile()
+        captura = Captura(perfil)
+        token = _captura_actual.set(captura)
+        try:
+            if perfil is not None:
+                perfil.enable()
+            yield captura
+        finally:
+            if perfil is not None:
+                perfil.disable()
+                _lock_perfil.release()
+            _captura_actual.reset(token)
+
+    def contadores(self):
+        with self._lock:
+            return {_nombre_legible(clave): valor for clave, valor in sorted(self._contadores.items())}
+
+    def tramos(self):
+        with self._lock:
+            return {
+                _nombre_legible(clave): {"cuenta": datos[0], "total": datos[1],
+                                         "media": datos[1] / datos[0], "maximo": datos[2]}
+                for clave, datos in sorted(self._tramos.items())
+            }
+
+    def texto_prometheus(self):
+        lineas = []
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            tramos = sorted((clave, list(datos)) for clave, datos in self._tramos.items())
+
+        vistos = set()
+        for (nombre, etiquetas), valor in contadores:
+            metrica = f"{PREFIJO}{nombre}_total"
+            if metrica not in vistos:
+                lineas.append(f"# TYPE {metrica} counter")
+                vistos.add(metrica)
+            lineas.append(f"{metrica}{_etiquetas_texto(etiquetas)} {valor}")
+
+        if tramos:
+            metrica = f"{PREFIJO}tramo_segundos"
+            lineas.append(f"# TYPE {metrica} histogram")
+            for (nombre, etiquetas), datos in tramos:
+                base = (("tramo", nombre),) + etiquetas
+                acumulado = 0
+                for limite, cuenta in zip(self.limites, datos[3:]):
+                    acumulado += cuenta
+                    lineas.append(f"{metrica}_bucket{_etiquetas_texto(base + (('le', repr(limite)),))} {acumulado}")
+                lineas.append(f"{metrica}_bucket{_etiquetas_texto(base + (('le', '+Inf'),))} {datos[0]}")
+                lineas.append(f"{metrica}_sum{_etiquetas_texto(base)} {datos[1]!r}")
+                lineas.append(f"{metrica}_count{_etiquetas_texto(base)} {datos[0]}")
+        return "\n".join(lineas) + "\n"
+
+    def limpiar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._tramos.clear()
+
+
+# Registro compartido por todo el proceso
+registro = RegistroMetricas(activo=os.environ.get("BOATER_METRICAS", "1") not in ("", "0"))
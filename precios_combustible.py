@@ -0,0 +1,287 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, asdict, replace
+from datetime import date
+from io import BytesIO
+from metricas_boater import registro
+
+# requests y pdfplumber se importan recién al descargar o parsear el PDF: importar este
+# módulo (y calculo_boater) no los carga.
+
+URL_PRECIOS = "https://www.mimit.gov.it/images/stories/carburanti/MediaRegionaleStradale.pdf"
+DIRECTORIO_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_precios")
+TTL_POR_DEFECTO = 6 * 3600  # segundos
+TIMEOUT_POR_DEFECTO = (5, 20)  # (conexión, lectura) en segundos
+REINTENTOS_POR_DEFECTO = 2
+ESPERA_REINTENTO = 0.5  # segundos; se duplica en cada reintento
+ESPERA_TRAS_FALLO = 60  # segundos sin volver a consultar la red después de una descarga fallida
+PRECIOS_POR_DEFECTO = (1.84, 1.75)  # (benzina, gasolio)
+
+
+@dataclass
+class PreciosCombustible:
+    benzina: float
+    gasolio: float
+    obtenido: float  # timestamp de la última descarga válida
+    origen: str  # "red", "cache" o "defecto"
+    etag: str = None
+    last_modified: str = None
+    regiones: dict = None  # región -> {producto: precio} de todo el PDF
+
+    def como_tupla(self):
+        return self.benzina, self.gasolio
+
+    # (benzina, gasolio) de cualquier región del PDF, sin distinguir mayúsculas
+    def precios_region(self, region):
+        for nombre, productos in (self.regiones or {}).items():
+            if nombre.casefold() == region.strip().casefold():
+                return productos["benzina"], productos["gasolio"]
+        raise KeyError(f"Región no encontrada en los precios MIMIT: {region}")
+
+
+# Escritura atómica: archivo temporal en el mismo directorio y os.replace
+def escribir_atomico(ruta, contenido):
+    directorio = os.path.dirname(ruta) or "."
+    os.makedirs(directorio, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directorio, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+        os.replace(tmp, ruta)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+_LINEA_PRODUCTO = re.compile(r"^(\S+)\s+(SELF|SERVITO)\s+(\d+[.,]\d+)$")
+_LINEAS_IGNORADAS = ("prezzi medi dei carburanti", "aggiornamento", "tipologia", "page ")
+
+
+# Recorre el PDF del MIMIT una sola vez y devuelve {región: {producto: precio}} con todas
+# las regiones. Cada región es una línea con su nombre seguida de las filas
+# "Gasolio SELF 1.584", "Benzina SELF 1.686", "GPL SERVITO 0.739", ...
+def extraer_precios_regionales(pdf):
+    import pdfplumber
+    if isinstance(pdf, bytes):
+        pdf = BytesIO(pdf)
+    regiones = {}
+    region = None
+    with pdfplumber.open(pdf) as documento:
+        for page in documento.pages:
+            for line in (page.extract_text() or "").split("\n"):
+                line = line.strip()
+                if not line or line.lower().startswith(_LINEAS_IGNORADAS):
+                    continue
+                producto = _LINEA_PRODUCTO.match(line)
+                if producto is None:
+                    region = line
+                    regiones[region] = {}
+                elif region is not None:
+                    regiones[region][producto.group(1).lower()] = float(producto.group(3).replace(',', '.'))
+    return {nombre: productos for nombre, productos in regiones.items() if productos}
+
+
+_regiones_por_hash = {}
+
+
+# Como extraer_precios_regionales, pero si el contenido del PDF ya se procesó (mismo
+# SHA-256) devuelve el resultado guardado en memoria o en disco sin volver a parsearlo.
+def extraer_precios_regionales_cacheado(contenido, directorio_cache=DIRECTORIO_CACHE):
+    clave = hashlib.sha256(contenido).hexdigest()
+    regiones = _regiones_por_hash.get(clave)
+    if regiones is not None:
+        registro.contar("pdf_cache_aciertos", nivel="memoria")
+        return regiones
+    ruta = os.path.join(directorio_cache, f"regiones_{clave[:16]}.json")
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            regiones = json.load(f)
+        registro.contar("pdf_cache_aciertos", nivel="disco")
+    except (OSError, ValueError):
+        registro.contar("pdf_cache_fallos")
+        with registro.tramo("precios.pdf"):
+            regiones = extraer_precios_regionales(contenido)
+        if regiones:
+            escribir_atomico(ruta, json.dumps(regiones).encode("utf-8"))
+    _regiones_por_hash[clave] = regiones
+    return regiones
+
+
+# Precios de Lombardía en el PDF del MIMIT. Devuelve (benzina, gasolio) o None.
+def extraer_precios_lombardia(pdf):
+    productos = extraer_precios_regionales(pdf).get("Lombardia", {})
+    if "benzina" not in productos or "gasolio" not in productos:
+        return None
+    return productos["benzina"], productos["gasolio"]
+
+
+class ProveedorPrecios:
+    # Precios de Lombardía con caché en memoria y en disco (un JSON por fecha de descarga).
+    # Mientras el último valor tenga menos de `ttl` segundos no se consulta la red; al
+    # vencer se hace una descarga condicional (ETag / Last-Modified), con reintentos y
+    # espera exponencial. Si la red falla, o en modo offline, se sirve el último valor
+    # válido con su fecha; tras un fallo no se vuelve a consultar la red durante
+    # `espera_tras_fallo` segundos.
+    def __init__(self, url=URL_PRECIOS, directorio_cache=DIRECTORIO_CACHE, ttl=TTL_POR_DEFECTO,
+                 timeout=TIMEOUT_POR_DEFECTO, offline=False, reintentos=REINTENTOS_POR_DEFECTO,
+                 espera_reintento=ESPERA_REINTENTO, espera_tras_fallo=ESPERA_TRAS_FALLO):
+        self.url = url
+        self.directorio_cache = directorio_cache
+        self.ttl = ttl
+        self.timeout = timeout
+        self.offline = offline
+        self.reintentos = reintentos
+        self.espera_reintento = espera_reintento
+        self.espera_tras_fallo = espera_tras_fallo
+        self._proximo_intento = 0.0
+        self._ultimo = None
+        self._lock = threading.Lock()
+        self._en_curso = None
+        self._lock_en_curso = threading.Lock()
+        self._pool = None
+
+    @property
+    def ruta_pdf(self):
+        return os.path.join(self.directorio_cache, "MediaRegionaleStradale.pdf")
+
+    def _ruta_json(self, fecha):
+        return os.path.join(self.directorio_cache, f"precios_{fecha.isoformat()}.json")
+
+    def _leer_disco(self):
+        archivos = sorted(glob.glob(os.path.join(self.directorio_cache, "precios_*.json")))
+        for ruta in reversed(archivos):
+            try:
+                with open(ruta, encoding="utf-8") as f:
+                    return PreciosCombustible(**json.load(f))
+            except (OSError, ValueError, TypeError):
+                continue
+        return None
+
+    def _guardar_disco(self, precios):
+        fecha = date.fromtimestamp(precios.obtenido)
+        contenido = json.dumps(asdict(precios)).encode("utf-8")
+        escribir_atomico(self._ruta_json(fecha), contenido)
+
+    def _vigente(self, precios):
+        return precios is not None and time.time() - precios.obtenido < self.ttl
+
+    def _sin_red(self):
+        return self.offline or time.time() < self._proximo_intento
+
+    def _get_con_reintentos(self, headers):
+        import requests
+        for intento in range(self.reintentos + 1):
+            try:
+                response = requests.get(self.url, headers=headers, timeout=self.timeout)
+                if response.status_code < 500:
+                    return response
+                response.raise_for_status()
+            except requests.RequestException:
+                if intento == self.reintentos:
+                    raise
+            registro.contar("precios_reintentos")
+            time.sleep(self.espera_reintento * 2 ** intento)
+
+    def _descargar(self, anterior):
+        headers = {}
+        if anterior is not None:
+            if anterior.etag:
+                headers["If-None-Match"] = anterior.etag
+            if anterior.last_modified:
+                headers["If-Modified-Since"] = anterior.last_modified
+
+        with registro.tramo("precios.descarga"):
+            response = self._get_con_reintentos(headers)
+        if response.status_code == 304 and anterior is not None:
+            # El PDF no cambió: se renueva la fecha del valor que ya teníamos
+            registro.contar("precios_no_modificado")
+            return replace(anterior, obtenido=time.time(), origen="red")
+        response.raise_for_status()
+
+        regiones = extraer_precios_regionales_cacheado(response.content, self.directorio_cache)
+        lombardia = regiones.get("Lombardia", {})
+        if "benzina" not in lombardia or "gasolio" not in lombardia:
+            raise ValueError("No se encontró Lombardia en el PDF de precios.")
+        escribir_atomico(self.ruta_pdf, response.content)
+        return PreciosCombustible(lombardia["benzina"], lombardia["gasolio"], time.time(), "red",
+                                  response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                                  regiones)
+
+    def obtener(self):
+        if self._vigente(self._ultimo):
+            registro.contar("precios_cache_aciertos", nivel="memoria")
+            return replace(self._ultimo, origen="cache")
+
+        with self._lock:
+            if self._ultimo is None:
+                with registro.tramo("precios.disco"):
+                    self._ultimo = self._leer_disco()
+            if self._vigente(self._ultimo):
+                registro.contar("precios_cache_aciertos", nivel="disco")
+                return replace(self._ultimo, origen="cache")
+
+            anterior = self._ultimo
+            if not self._sin_red():
+                try:
+                    nuevo = self._descargar(anterior)
+                    self._ultimo = nuevo
+                    self._guardar_disco(nuevo)
+                    return nuevo
+                except Exception:
+                    registro.contar("precios_fallos_descarga")
+                    self._proximo_intento = time.time() + self.espera_tras_fallo
+                    if anterior is None:
+                        print("⚠️  No se pudieron obtener los precios actuales. Usando valores por defecto.")
+
+            if anterior is not None:
+                # Último valor válido, aunque esté vencido
+                registro.contar("precios_vencidos_servidos")
+                return replace(anterior, origen="cache")
+
+        registro.contar("precios_valores_defecto")
+        return PreciosCombustible(*PRECIOS_POR_DEFECTO, time.time(), "defecto")
+
+
+    # Obtiene los precios en un hilo de fondo y devuelve un concurrent.futures.Future.
+    # Mientras hay una descarga en curso, todas las llamadas reciben el mismo Future.
+    def obtener_en_segundo_plano(self):
+        if self._vigente(self._ultimo) or self._sin_red():
+            futuro = Future()
+            futuro.set_result(self.obtener())
+            return futuro
+        with self._lock_en_curso:
+            if self._en_curso is None or self._en_curso.done():
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="precios")
+                self._en_curso = self._pool.submit(self.obtener)
+            return self._en_curso
+
+    async def obtener_async(self):
+        import asyncio
+        return await asyncio.wrap_future(self.obtener_en_segundo_plano())
+
+
+_proveedor = None
+_lock_proveedor = threading.Lock()
+
+
+# Proveedor compartido por todo el proceso
+def obtener_proveedor():
+    global _proveedor
+    if _proveedor is None:
+        with _lock_proveedor:
+            if _proveedor is None:
+                _proveedor = ProveedorPrecios(
+                    url=os.environ.get("BOATER_URL_PRECIOS", URL_PRECIOS),
+                    ttl=float(os.environ.get("BOATER_TTL_PRECIOS", TTL_POR_DEFECTO)),
+                    offline=os.environ.get("BOATER_OFFLINE", "") not in ("", "0"),
+                )
+    return _proveedor
@@ -0,0 +1,108 @@
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from io import BytesIO
+import numpy as np
+from metricas_boater import registro
+
+CAPACIDAD_CACHE = 64
+# Con grillas finas no se marcan los puntos, y con muchas curvas hay una sola leyenda
+# debajo de la figura en vez de una por panel (ubicarla dentro de cada panel es lento)
+MAX_PUNTOS_CON_MARCADOR = 30
+MAX_CURVAS_LEYENDA_PANEL = 8
+COLUMNAS_LEYENDA = 4
+
+# Paneles disponibles: (título, etiqueta eje y, marcador, divide por asientos)
+PANELES = {
+    "costo": ("Costo del viaje en función de la distancia", "Costo (€)", "o", False),
+    "asiento": ("Costo por asiento en función de la distancia", "Costo por asiento (€)", "s", True),
+}
+
+
+# Grilla de distancias de las curvas (paso, 2*paso, ..., maximo) común a las dos interfaces
+def grilla_distancias(paso, maximo):
+    return np.arange(paso, maximo + paso / 2, paso, dtype=float)
+
+
+# Dibuja en `ax` las curvas ya calculadas. Cada curva es un dict con "nombre",
+# "asientos" y "costos" (costo total por distancia).
+def dibujar_curvas(ax, curvas, distancias, panel="costo", leyenda=True):
+    titulo, etiqueta_y, marcador, por_asiento = PANELES[panel]
+    if len(distancias) > MAX_PUNTOS_CON_MARCADOR:
+        marcador = None
+    for curva in curvas:
+        costos = np.asarray(curva["costos"], dtype=float)
+        if por_asiento:
+            costos = costos / curva["asientos"]
+        ax.plot(distancias, costos, marker=marcador, label=curva["nombre"])
+    ax.set_title(titulo)
+    ax.set_xlabel("Distancia (km)")
+    ax.set_ylabel(etiqueta_y)
+    ax.grid(True)
+    if leyenda and curvas:
+        ax.legend()
+
+
+# Dibuja (o vuelve a dibujar) todos los paneles de `fig` con las curvas dadas
+def dibujar_figura(fig, curvas, distancias, paneles=("costo", "asiento")):
+    fig.clear()
+    leyenda_por_panel = len(curvas) <= MAX_CURVAS_LEYENDA_PANEL
+    fig.set_layout_engine("tight" if leyenda_por_panel else "constrained")
+    ejes = fig.subplots(len(paneles), 1, squeeze=False)[:, 0]
+    for ax, panel in zip(ejes, paneles):
+        dibujar_curvas(ax, curvas, distancias, panel, leyenda_por_panel)
+    if not leyenda_por_panel:
+        fig.legend(*ejes[0].get_legend_handles_labels(), loc="outside lower center",
+                   ncol=COLUMNAS_LEYENDA, fontsize="small")
+
+
+# Figura con un panel por elemento de `paneles`, sin pasar por pyplot
+def crear_figura(curvas, distancias, paneles=("costo", "asiento")):
+    # matplotlib se importa recién al dibujar
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    alto_leyenda = 0.0
+    if len(curvas) > MAX_CURVAS_LEYENDA_PANEL:
+        alto_leyenda = 0.2 * math.ceil(len(curvas) / COLUMNAS_LEYENDA)
+    fig = Figure(figsize=(6, 4 * len(paneles) + alto_leyenda))
+    FigureCanvasAgg(fig)
+    dibujar_figura(fig, curvas, distancias, paneles)
+    return fig
+
+
+def clave_curvas(curvas, distancias, paneles, formato):
+    h = hashlib.sha1()
+    h.update(repr((tuple(paneles), formato)).encode())
+    h.update(np.asarray(distancias, dtype=float).tobytes())
+    for curva in curvas:
+        h.update(repr((curva["nombre"], float(curva["asientos"]))).encode())
+        h.update(np.asarray(curva["costos"], dtype=float).tobytes())
+    return h.hexdigest()
+
+
+_cache = OrderedDict()
+_lock_cache = threading.Lock()
+
+
+# Bytes PNG/SVG de las curvas. El mismo conjunto de curvas se dibuja una sola vez:
+# esos bytes sirven tanto para mostrar la imagen como para descargarla.
+def renderizar(curvas, distancias, formato="png", paneles=("costo", "asiento")):
+    clave = clave_curvas(curvas, distancias, paneles, formato)
+    with _lock_cache:
+        if clave in _cache:
+            _cache.move_to_end(clave)
+            registro.contar("render_cache_aciertos")
+            return _cache[clave]
+
+    registro.contar("render_cache_fallos")
+    buffer = BytesIO()
+    with registro.tramo("render.matplotlib", formato=formato):
+        crear_figura(curvas, distancias, paneles).savefig(buffer, format=formato)
+    contenido = buffer.getvalue()
+
+    with _lock_cache:
+        _cache[clave] = contenido
+        while len(_cache) > CAPACIDAD_CACHE:
+            _cache.popitem(last=False)
+    return contenido
@@ -0,0 +1,163 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from calculo_boater import calcular_costos_batch
+from historial_precios import DIRECTORIO_DATOS, cargar_historial, producto_para_motor
+
+RUTAS_SERIES = (
+    os.path.join(DIRECTORIO_DATOS, "prezzi_mensili_benzina_dal_1996_a_20250501.csv"),
+    os.path.join(DIRECTORIO_DATOS, "prezzi_mensili_gasolio auto_dal_1996_a_20250501.csv"),
+)
+PRODUCTOS = ("benzina", "gasolio auto")
+N_TRAYECTORIAS = 100_000
+PERCENTILES = (50, 90, 99)
+METODOS = ("bootstrap", "normal")
+
+
+class ModeloRetornos:
+    # Retornos logarítmicos mes a mes de benzina y gasolio auto, tomados en los mismos meses
+    # para conservar la correlación entre ambos. "bootstrap" remuestrea meses históricos;
+    # "normal" ajusta una normal multivariada (media y covarianza) a esos retornos.
+    def __init__(self, retornos, precios_iniciales, metodo="bootstrap"):
+        if metodo not in METODOS:
+            raise ValueError(f"Método no reconocido: {metodo} (opciones: {', '.join(METODOS)})")
+        self.retornos = np.asarray(retornos, dtype=float)
+        self.precios_iniciales = np.asarray(precios_iniciales, dtype=float)
+        self.metodo = metodo
+        self.media = self.retornos.mean(axis=0)
+        self.covarianza = np.cov(self.retornos, rowvar=False)
+
+    # `desde_anio` limita la muestra a los últimos años; `precios_iniciales` (benzina, gasolio)
+    # reemplaza al último precio de la serie, por ejemplo con el precio MIMIT de hoy.
+    @classmethod
+    def desde_historial(cls, rutas=RUTAS_SERIES, desde_anio=None, precios_iniciales=None, metodo="bootstrap"):
+        historial = cargar_historial(rutas)
+        series = []
+        for producto in PRODUCTOS:
+            anios, meses, valores = historial.serie(producto)
+            series.append(dict(zip((anios * 12 + meses - 1).tolist(), valores.tolist())))
+        # Solo meses consecutivos con precio de ambos productos
+        comunes = sorted(set(series[0]) & set(series[1]))
+        if desde_anio is not None:
+            comunes = [m for m in comunes if m >= desde_anio * 12]
+        pares = [(a, b) for a, b in zip(comunes[:-1], comunes[1:]) if b == a + 1]
+        if len(pares) < 2:
+            raise ValueError("No hay suficientes meses consecutivos para estimar los retornos.")
+        retornos = np.array([[np.log(s[b] / s[a]) for s in series] for a, b in pares])
+        if precios_iniciales is None:
+            precios_iniciales = [s[comunes[-1]] for s in series]
+        return cls(retornos, precios_iniciales, metodo)
+
+    # Precios simulados, array (n, meses, producto): el mes h es el precio h meses después del inicial
+    def simular(self, meses, n=N_TRAYECTORIAS, semilla=0):
+        rng = np.random.default_rng(semilla)
+        if self.metodo == "bootstrap":
+            retornos = self.retornos[rng.integers(0, len(self.retornos), size=(n, meses))]
+        else:
+            retornos = rng.multivariate_normal(self.media, self.covarianza, size=(n, meses))
+        return self.precios_iniciales * np.exp(np.cumsum(retornos, axis=1))
+
+
+# Coeficientes lineales de cada viaje: el costo es lineal en el precio del combustible,
+#   costo = pendiente * precio + espera
+# así que cada trayectoria de precios se cotiza con un producto de matrices.
+def coeficientes_viajes(tipo_motor, hp, vel_crucero, asientos, distancia, tiempo_espera=None):
+    _, pendiente = calcular_costos_batch(tipo_motor, hp, vel_crucero, asientos, distancia, 1.0)
+    _, espera = calcular_costos_batch(tipo_motor, hp, vel_crucero, asientos, distancia, 0.0,
+                                      0.0 if tiempo_espera is None else tiempo_espera)
+    return pendiente, espera
+
+
+def _costos_contratos(modelo, meses, n, semilla, pendientes, esperas, percentiles):
+    # Se ejecuta en cada proceso: con la misma semilla todos generan las mismas trayectorias,
+    # así que el resultado no depende de cuántos procesos se usen
+    precios = modelo.simular(meses, n, semilla)
+    costos = np.einsum("nhp,chp->nc", precios, pendientes) + esperas
+    return np.percentile(costos, percentiles, axis=0).T, costos.mean(axis=0)
+
+
+# Distribución del costo de cada contrato bajo `n` trayectorias de precios. Cada viaje tiene un
+# "contrato" (por defecto, uno por viaje) y un "mes" (meses desde hoy en que se hace, desde 1).
+# Devuelve un dict con "contratos", "percentiles" (contrato x percentil), "media" y "costo_actual"
+# (con los precios iniciales).
+def simular_costos(tipo_motor, hp, vel_crucero, asientos, distancia, tiempo_espera=None, mes=1, contrato=None,
+                   modelo=None, n=N_TRAYECTORIAS, semilla=0, procesos=1, percentiles=PERCENTILES,
+                   tamano_grupo=64):
+    modelo = modelo or ModeloRetornos.desde_historial()
+    tipo_motor = np.char.lower(np.char.strip(np.asarray(tipo_motor, dtype=str)))
+    pendiente, espera = np.broadcast_arrays(
+        *coeficientes_viajes(tipo_motor, hp, vel_crucero, asientos, distancia, tiempo_espera))
+    tipo_motor = np.broadcast_to(tipo_motor, pendiente.shape)
+    mes = np.broadcast_to(np.asarray(mes, dtype=int), pendiente.shape)
+    if (mes < 1).any():
+        raise ValueError("El mes de cada viaje debe ser 1 o mayor.")
+    if contrato is None:
+        contrato = np.arange(pendiente.size)
+    contratos, codigos = np.unique(np.broadcast_to(np.asarray(contrato), pendiente.shape).ravel(), return_inverse=True)
+
+    # Pendientes agregadas por contrato, mes y producto
+    meses = int(mes.max())
+    producto = np.array([PRODUCTOS.index(producto_para_motor(m)) for m in tipo_motor.ravel()])
+    pendientes = np.zeros((len(contratos), meses, len(PRODUCTOS)))
+    np.add.at(pendientes, (codigos, mes.ravel() - 1, producto), pendiente.ravel())
+    esperas = np.bincount(codigos, weights=espera.ravel(), minlength=len(contratos))
+    costo_actual = np.einsum("chp,p->c", pendientes, modelo.precios_iniciales) + esperas
+
+    # Grupos de contratos: acotan la memoria (n x grupo) y se reparten entre procesos
+    grupos = [slice(i, i + tamano_grupo) for i in range(0, len(contratos), tamano_grupo)]
+    argumentos = [(modelo, meses, n, semilla, pendientes[g], esperas[g], percentiles) for g in grupos]
+    if procesos > 1 and len(grupos) > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            resultados = list(pool.map(_costos_contratos, *zip(*argumentos)))
+    else:
+        resultados = [_costos_contratos(*a) for a in argumentos]
+
+    return {
+        "contratos": contratos,
+        "percentiles": np.vstack([r[0] for r in resultados]),
+        "media": np.concatenate([r[1] for r in resultados]),
+        "costo_actual": costo_actual,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distribución del costo de viajes con precios de combustible simulados.")
+    parser.add_argument("viajes", help="CSV de viajes: tipo_motor, hp, vel_crucero, asientos, distancia "
+                                       "[, tiempo_espera, mes, contrato]")
+    parser.add_argument("salida", help="CSV con P50/P90/P99, media y costo actual por contrato")
+    parser.add_argument("--trayectorias", type=int, default=N_TRAYECTORIAS)
+    parser.add_argument("--metodo", choices=METODOS, default="bootstrap")
+    parser.add_argument("--desde", type=int, help="Estimar los retornos solo desde este año")
+    parser.add_argument("--precio-benzina", type=float, help="Precio inicial de benzina (por defecto, el último de la serie)")
+    parser.add_argument("--precio-gasolio", type=float, help="Precio inicial de gasolio (por defecto, el último de la serie)")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    viajes = pd.read_csv(args.viajes)
+    modelo = ModeloRetornos.desde_historial(desde_anio=args.desde, metodo=args.metodo)
+    for i, precio in enumerate((args.precio_benzina, args.precio_gasolio)):
+        if precio is not None:
+            modelo.precios_iniciales[i] = precio
+    resultado = simular_costos(
+        viajes["tipo_motor"].to_numpy(dtype=str), viajes["hp"].to_numpy(dtype=float),
+        viajes["vel_crucero"].to_numpy(dtype=float), viajes["asientos"].to_numpy(dtype=float),
+        viajes["distancia"].to_numpy(dtype=float),
+        viajes["tiempo_espera"].fillna(0.0).to_numpy(dtype=float) if "tiempo_espera" in viajes.columns else None,
+        viajes["mes"].to_numpy(dtype=int) if "mes" in viajes.columns else 1,
+        viajes["contrato"].to_numpy() if "contrato" in viajes.columns else None,
+        modelo=modelo, n=args.trayectorias, semilla=args.semilla, procesos=args.procesos)
+
+    tabla = pd.DataFrame({"contrato": resultado["contratos"], "costo_actual": resultado["costo_actual"]})
+    for i, p in enumerate(PERCENTILES):
+        tabla[f"p{p}"] = resultado["percentiles"][:, i]
+    tabla["media"] = resultado["media"]
+    tabla.to_csv(args.salida, index=False)
+    print(f"{len(tabla)} contratos simulados con {args.trayectorias} trayectorias en {args.salida}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import numpy as np
+from metricas_boater import registro
+
+RUTA_EXCEL = "Boater_excel.xlsx"
+HOJA_EXCEL = "Foglio1"
+# Tarifas que usa obtener_tablas() por defecto: el Excel o una instantánea compilada (.btar)
+RUTA_TARIFAS = os.environ.get("BOATER_TARIFAS", RUTA_EXCEL)
+EXTENSION_INSTANTANEA = ".btar"
+
+# Constantes por tipo de motor (no están en el Excel; las instantáneas las guardan con la versión)
+COEFICIENTES_MOTOR = {
+    "motor fuera de borda": 0.46,
+    "motor interno nafta": 0.30,
+    "motor interno diesel": 0.25,
+}
+
+# Formato de instantánea: MAGIA, versión del formato y largo del encabezado JSON, el
+# encabezado (rellenado hasta múltiplo de 8 bytes) y luego los arrays float64 little-endian.
+# El encabezado guarda la forma de cada array y su desplazamiento desde el inicio de los datos,
+# para leerlos sin copiar.
+MAGIA_INSTANTANEA = b"BOATTAR\0"
+VERSION_FORMATO = 1
+_CABECERA = struct.Struct("<8sII")
+
+
+# Índice de la columna más cercana a cada valor, por bisección sobre columnas ordenadas.
+# En caso de empate devuelve la columna menor, igual que obtener_valor_mas_cercano.
+def indice_mas_cercano(columnas, valores):
+    valores = np.asarray(valores, dtype=float)
+    derecha = np.searchsorted(columnas, valores, side="left")
+    derecha = np.clip(derecha, 1, len(columnas) - 1) if len(columnas) > 1 else np.zeros_like(derecha)
+    izquierda = np.maximum(derecha - 1, 0)
+    usar_izquierda = (valores - columnas[izquierda]) <= (columnas[derecha] - valores)
+    return np.where(usar_izquierda, izquierda, derecha)
+
+
+def _fila_numerica(fila):
+    # Devuelve (columnas, valores) de una fila del Excel, descartando celdas vacías
+    import pandas as pd
+    valores = pd.to_numeric(fila.iloc[1:], errors="coerce")
+    return valores.dropna()
+
+
+class TariffTables:
+    # Tablas de tarifas del Excel ya procesadas: columnas numéricas ordenadas y
+    # una fila de factores por tipo de motor.
+    def __init__(self, columnas_hp, factores_hp, columnas_asientos, factores_asientos,
+                 columnas_espera, tarifas_espera, mtime=None, ruta=None, coeficientes=None, version=None):
+        self.columnas_hp, self.factores_hp = self._ordenar(columnas_hp, factores_hp)
+        self.columnas_asientos, self.factores_asientos = self._ordenar(columnas_asientos, factores_asientos)
+        self.columnas_espera, tarifas = self._ordenar(columnas_espera, {"espera": tarifas_espera})
+        self.tarifas_espera = tarifas["espera"]
+        # Matrices motor x columna para las consultas vectorizadas
+        self.motores = tuple(self.factores_hp)
+        self.matriz_hp = np.vstack([self.factores_hp[m] for m in self.motores])
+        self.matriz_asientos = np.vstack([self.factores_asientos[m] for m in self.motores])
+        self.coeficientes = dict(COEFICIENTES_MOTOR if coeficientes is None else coeficientes)
+        self.mtime = mtime
+        self.ruta = ruta
+        self.version = version or (os.path.basename(ruta) if ruta else None)
+
+    # Si las columnas ya vienen ordenadas (como en una instantánea) no se copia nada
+    @staticmethod
+    def _ordenar(columnas, filas):
+        columnas = np.asarray(columnas, dtype=float)
+        filas = {motor: np.asarray(valores, dtype=float) for motor, valores in filas.items()}
+        if np.all(columnas[1:] >= columnas[:-1]):
+            return columnas, filas
+        orden = np.argsort(columnas, kind="stable")
+        return columnas[orden], {motor: valores[orden] for motor, valores in filas.items()}
+
+    @classmethod
+    def desde_excel(cls, ruta=RUTA_EXCEL, hoja=HOJA_EXCEL):
+        # pandas/openpyxl solo se cargan al leer el Excel
+        import pandas as pd
+        mtime = os.stat(ruta).st_mtime_ns
+        df = pd.read_excel(ruta, sheet_name=hoja, header=None)
+        etiquetas = df.iloc[:, 0].astype(str).str.strip().str.lower()
+
+        # Tabla HP: fila de encabezado "Caballos de fuerza" y las tres filas de motores siguientes
+        fila_hp = etiquetas[etiquetas == "caballos de fuerza"].index[0]
+        encabezado_hp = _fila_numerica(df.iloc[fila_hp])
+        factores_hp = {
+            etiquetas[i]: df.iloc[i, encabezado_hp.index].astype(float).values
+            for i in range(fila_hp + 1, fila_hp + 4)
+        }
+
+        # Tabla asientos: fila de encabezado "Asientos" y las tres filas de motores siguientes
+        fila_asientos = etiquetas[etiquetas == "asientos"].index[0]
+        encabezado_asientos = _fila_numerica(df.iloc[fila_asientos])
+        factores_asientos = {
+            etiquetas[i]: df.iloc[i, encabezado_asientos.index].astype(float).values
+            for i in range(fila_asientos + 1, fila_asientos + 4)
+        }
+
+        # Fila "espera": las tarifas quedan indexadas por el encabezado de la hoja
+        # (primera fila), como lo hacía calcular_costo al leer con pd.read_excel
+        filas_espera = df.index[df.eq("espera").any(axis=1)]
+        if len(filas_espera):
+            tarifas = _fila_numerica(df.iloc[filas_espera[0]])
+            columnas_espera = encabezado_hp.reindex(tarifas.index)
+            validas = columnas_espera.notna()
+            columnas_espera = columnas_espera[validas].values
+            tarifas_espera = tarifas[validas].values
+        else:
+            columnas_espera, tarifas_espera = [], []
+
+        return cls(encabezado_hp.values, factores_hp, encabezado_asientos.values, factores_asientos,
+                   columnas_espera, tarifas_espera, mtime=mtime, ruta=ruta)
+
+    @classmethod
+    def desde_instantanea(cls, ruta):
+        # Los vectores son vistas de solo lectura sobre el archivo mapeado en memoria (ya ordenados)
+        mtime = os.stat(ruta).st_mtime_ns
+        encabezado, arrays = leer_instantanea(ruta)
+        motores = encabezado["motores"]
+        return cls(arrays["columnas_hp"], dict(zip(motores, arrays["matriz_hp"])),
+                   arrays["columnas_asientos"], dict(zip(motores, arrays["matriz_asientos"])),
+                   arrays["columnas_espera"], arrays["tarifas_espera"], mtime=mtime, ruta=ruta,
+                   coeficientes=dict(zip(motores, arrays["coeficientes"].tolist())),
+                   version=encabezado.get("version"))
+
+    @classmethod
+    def desde_archivo(cls, ruta, hoja=HOJA_EXCEL):
+        if ruta.endswith(EXTENSION_INSTANTANEA):
+            return cls.desde_instantanea(ruta)
+        return cls.desde_excel(ruta, hoja)
+
+    def factor_hp(self, tipo_motor, hp):
+        fila = self.factores_hp[tipo_motor]
+        return float(fila[indice_mas_cercano(self.columnas_hp, hp)])
+
+    def factor_asientos(self, tipo_motor, asientos):
+        fila = self.factores_asientos[tipo_motor]
+        return float(fila[indice_mas_cercano(self.columnas_asientos, asientos)])
+
+    # Versiones vectorizadas: `filas_motor` son índices en self.motores
+    def factores_hp_lote(self, filas_motor, hp):
+        return self.matriz_hp[filas_motor, indice_mas_cercano(self.columnas_hp, hp)]
+
+    def factores_asientos_lote(self, filas_motor, asientos):
+        return self.matriz_asientos[filas_motor, indice_mas_cercano(self.columnas_asientos, asientos)]
+
+    def tarifas_espera_lote(self, distancia):
+        if len(self.columnas_espera) == 0:
+            return np.zeros(np.shape(distancia))
+        return self.tarifas_espera[indice_mas_cercano(self.columnas_espera, distancia)]
+
+    def tarifa_espera(self, distancia):
+        # None si el Excel no tiene fila "espera"
+        if len(self.columnas_espera) == 0:
+            return None
+        return float(self.tarifas_espera[indice_mas_cercano(self.columnas_espera, distancia)])
+
+
+# Escribe las tablas como instantánea binaria (ver MAGIA_INSTANTANEA). `version` es una
+# etiqueta libre, por ejemplo la fecha de la revisión de tarifas.
+def guardar_instantanea(tablas, ruta, version=None, origen=None):
+    from precios_combustible import escribir_atomico
+    arrays = {
+        "columnas_hp": tablas.columnas_hp,
+        "matriz_hp": tablas.matriz_hp,
+        "columnas_asientos": tablas.columnas_asientos,
+        "matriz_asientos": tablas.matriz_asientos,
+        "columnas_espera": tablas.columnas_espera,
+        "tarifas_espera": tablas.tarifas_espera,
+        "coeficientes": np.array([tablas.coeficientes[m] for m in tablas.motores]),
+    }
+    ubicaciones = {}
+    desplazamiento = 0
+    for nombre, array in arrays.items():
+        ubicaciones[nombre] = [desplazamiento, list(np.shape(array))]
+        desplazamiento += np.asarray(array).size * 8
+    encabezado = json.dumps({
+        "version": version or tablas.version,
+        "origen": origen,
+        "creado": time.time(),
+        "motores": list(tablas.motores),
+        "arrays": ubicaciones,
+    }).encode("utf-8")
+    encabezado += b" " * (-(_CABECERA.size + len(encabezado)) % 8)
+
+    contenido = bytearray(_CABECERA.pack(MAGIA_INSTANTANEA, VERSION_FORMATO, len(encabezado)))
+    contenido += encabezado
+    for array in arrays.values():
+        contenido += np.ascontiguousarray(array, dtype="<f8").tobytes()
+    escribir_atomico(ruta, bytes(contenido))
+
+
+# Devuelve (encabezado, {nombre: array}) de una instantánea, con los arrays mapeados en memoria
+def leer_instantanea(ruta):
+    with open(ruta, "rb") as f:
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mapa) < _CABECERA.size:
+        raise ValueError(f"Instantánea de tarifas inválida: {ruta}")
+    magia, version_formato, largo = _CABECERA.unpack_from(mapa, 0)
+    if magia != MAGIA_INSTANTANEA:
+        raise ValueError(f"Instantánea de tarifas inválida: {ruta}")
+    if version_formato != VERSION_FORMATO:
+        raise ValueError(f"Formato de instantánea no soportado ({version_formato}): {ruta}")
+    encabezado = json.loads(mapa[_CABECERA.size:_CABECERA.size + largo])
+    inicio_datos = _CABECERA.size + largo
+    arrays = {}
+    for nombre, (desplazamiento, forma) in encabezado["arrays"].items():
+        cantidad = int(np.prod(forma))
+        arrays[nombre] = np.frombuffer(mapa, dtype="<f8", count=cantidad,
+                                       offset=inicio_datos + desplazamiento).reshape(forma)
+    return encabezado, arrays
+
+
+# Compila un Excel de tarifas a una instantánea binaria
+def compilar_instantanea(ruta_excel, ruta_salida, version=None, hoja=HOJA_EXCEL):
+    import hashlib
+    tablas = TariffTables.desde_excel(ruta_excel, hoja)
+    with open(ruta_excel, "rb") as f:
+        origen = {"archivo": os.path.basename(ruta_excel), "sha256": hashlib.sha256(f.read()).hexdigest()}
+    guardar_instantanea(tablas, ruta_salida, version, origen)
+    return TariffTables.desde_instantanea(ruta_salida)
+
+
+_tablas_cargadas = {}
+_lock_tablas = threading.Lock()
+
+
+# Devuelve las tablas del Excel o de una instantánea .btar, volviendo a leer el archivo solo si
+# cambió su mtime. Cada ruta se guarda por separado: se pueden usar varias versiones a la vez.
+def obtener_tablas(ruta=RUTA_TARIFAS, hoja=HOJA_EXCEL):
+    clave = (os.path.abspath(ruta), hoja)
+    mtime = os.stat(ruta).st_mtime_ns
+    tablas = _tablas_cargadas.get(clave)
+    if tablas is not None and tablas.mtime == mtime:
+        return tablas
+    with _lock_tablas:
+        tablas = _tablas_cargadas.get(clave)
+        if tablas is None or tablas.mtime != mtime:
+            instantanea = ruta.endswith(EXTENSION_INSTANTANEA)
+            registro.contar("tarifas_lecturas_instantanea" if instantanea else "tarifas_lecturas_excel")
+            with registro.tramo("tarifas.instantanea" if instantanea else "tarifas.excel"):
+                tablas = TariffTables.desde_archivo(ruta, hoja)
+            _tablas_cargadas[clave] = tablas
+    return tablas
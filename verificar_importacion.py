@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+PESADOS = ("pandas", "openpyxl", "requests", "pdfplumber", "matplotlib")
+
+# Módulo -> (presupuesto en ms de importación acumulada, módulos pesados que no debe cargar)
+PRESUPUESTOS = {
+    "metricas_boater": (50, PESADOS + ("numpy", "cProfile")),
+    "tarifas_boater": (250, PESADOS),
+    "precios_combustible": (120, PESADOS + ("numpy",)),
+    "calculo_boater": (250, PESADOS),
+    "cache_cotizaciones": (250, PESADOS),
+    "historial_precios": (250, PESADOS),
+    "matriz_precios": (250, PESADOS),
+    "render_curvas": (250, PESADOS),
+    "cotizar_lote": (300, PESADOS),
+    "flota_boater": (300, PESADOS),
+    "compilar_tarifas": (250, PESADOS),
+    "riesgo_precios": (300, PESADOS),
+    "api_boater": (350, PESADOS),
+}
+
+_LINEA_IMPORTTIME = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)")
+
+
+# Importa `modulo` en un proceso nuevo con -X importtime. Devuelve (ms acumulados, pesados cargados).
+def medir_importacion(modulo, pesados):
+    codigo = (f"import sys; import {modulo}; "
+              f"print(__import__('json').dumps([m for m in {list(pesados)!r} if m in sys.modules]))")
+    resultado = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo], cwd=DIRECTORIO,
+                               capture_output=True, text=True, check=True)
+    acumulado = None
+    for linea in resultado.stderr.splitlines():
+        coincidencia = _LINEA_IMPORTTIME.match(linea)
+        if coincidencia and coincidencia.group(2) == modulo:
+            acumulado = int(coincidencia.group(1)) / 1000
+    return acumulado, json.loads(resultado.stdout.strip().splitlines()[-1])
+
+
+def verificar(modulos=None, repeticiones=3, factor=1.0):
+    fallos = []
+    for modulo, (presupuesto, pesados) in PRESUPUESTOS.items():
+        if modulos and modulo not in modulos:
+            continue
+        # Se toma la mejor de varias corridas para no depender del ruido del disco
+        mediciones = [medir_importacion(modulo, pesados) for _ in range(repeticiones)]
+        tiempo = min(m[0] for m in mediciones)
+        cargados = mediciones[-1][1]
+        limite = presupuesto * factor
+        estado = "ok" if tiempo <= limite and not cargados else "FALLA"
+        print(f"{modulo:22} {tiempo:8.1f} ms / {limite:6.0f} ms  {estado}"
+              + (f"  (carga {', '.join(cargados)})" if cargados else ""))
+        if estado != "ok":
+            fallos.append(modulo)
+    return fallos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica el tiempo de importación de los módulos de Boater.")
+    parser.add_argument("modulos", nargs="*", help="Módulos a verificar (por defecto, todos)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--factor", type=float, default=float(os.environ.get("BOATER_FACTOR_IMPORTACION", "1")),
+                        help="Multiplica los presupuestos (máquinas lentas o CI)")
+    args = parser.parse_args(argv)
+    fallos = verificar(args.modulos, args.repeticiones, args.factor)
+    if fallos:
+        print(f"Fuera de presupuesto: {', '.join(fallos)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()